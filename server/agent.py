@@ -1,10 +1,35 @@
+import copy
+import logging
 import dspy
-import datetime
+import numpy as np
 from mem0 import Memory
+from usearch.index import Index
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import zlib
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# text-embedding-3 models support truncated (Matryoshka) embeddings; 512 dims
+# cut Pinecone payloads and local cosine work ~3x for little recall loss.
+# The Pinecone index must be created with the same dimension.
+EMBEDDING_DIMS = int(os.getenv("PINECONE_MODEL_DIM", 512))
+
+# Searches are answered from an in-process mirror of the user's Mem0 memories,
+# filled from the vectors Pinecone already stores and reloaded after the user's
+# next write or once it is this old, so writes from other workers show up. Users
+# with more memories than the cap are searched in Mem0 only.
+LOCAL_INDEX_TTL_SECONDS = 300
+LOCAL_INDEX_MAX_MEMORIES = 500
+
+# Searches pull this many candidates and re-rank them with MMR so repeated
+# facts don't crowd out the top results; higher lambda favours relevance
+MMR_CANDIDATES = 25
+MMR_LAMBDA = 0.6
+
 # Initialize Mem0 memory system
 config = {
     "llm": {
@@ -17,14 +42,15 @@ config = {
     "embedder": {
         "provider": "openai",
         "config": {
-            "model": "text-embedding-3-small"
+            "model": "text-embedding-3-small",
+            "embedding_dims": EMBEDDING_DIMS,
         }
     },
     "vector_store": {
         "provider": "pinecone",
         "config": {
             "collection_name": os.getenv("PINECONE_COLLECTION", "testing2"),
-            "embedding_model_dims": os.getenv("PINECONE_MODEL_DIM", 1536),
+            "embedding_model_dims": EMBEDDING_DIMS,
             "serverless_config": {
                 "cloud": os.getenv("PINECONE_CLOUD", "aws"),
                 "region": os.getenv("PINECONE_REGION", "us-east-1"),
@@ -33,34 +59,252 @@ config = {
         },
     },
 }
+
+
+class LocalMemoryIndex:
+    """In-process HNSW index mirroring the memories written for one user."""
+
+    def __init__(self, ndim: int = EMBEDDING_DIMS, complete: bool = True):
+        # False when the user's memories were not all loaded; searches then go to Mem0
+        self.complete = complete
+        self._index = Index(
+            ndim=ndim,
+            metric="cos",
+            dtype="f32",
+            connectivity=16,
+            expansion_add=64,
+            expansion_search=40,
+        )
+        self._texts: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._created_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._created_at > LOCAL_INDEX_TTL_SECONDS
+
+    def add(self, text: str, vector: List[float], key: Optional[int] = None) -> None:
+        """Add a text, replacing any existing entry stored under the same key."""
+        with self._lock:
+            if key is None:
+                key = len(self._texts)
+            elif key in self._texts:
+                self._index.remove(key)
+            self._index.add(key, np.asarray(vector, dtype=np.float32))
+            self._texts[key] = text
+
+    def search(self, vector: List[float], limit: int) -> List[str]:
+        with self._lock:
+            matches = self._index.search(np.asarray(vector, dtype=np.float32), limit)
+            return [self._texts[int(key)] for key in matches.keys]
+
+    def search_diverse(self, vector: List[float], limit: int, candidates: int = MMR_CANDIDATES) -> List[str]:
+        """Return `limit` texts chosen by MMR from the nearest `candidates`."""
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            matches = self._index.search(query, max(limit, candidates))
+            keys = [int(key) for key in matches.keys]
+            if not keys:
+                return []
+            vectors = np.vstack([self._index.get(key) for key in keys])
+            texts = [self._texts[key] for key in keys]
+        return [texts[i] for i in _mmr_select(query, vectors, limit)]
+
+
+def _mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, weight: float = MMR_LAMBDA) -> List[int]:
+    """Pick k rows of candidates by maximal marginal relevance, in relevance order."""
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(candidates)):
+        scores = weight * relevance - (1 - weight) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return sorted(selected, key=lambda i: -relevance[i])
+
+
+def _dedupe_memories(results: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Drop results whose text repeats a higher-ranked one, keeping at most limit."""
+    seen = set()
+    unique = []
+    for result in results:
+        text = " ".join(str(result.get("memory", "")).lower().split())
+        if text in seen:
+            continue
+        seen.add(text)
+        unique.append(result)
+        if len(unique) == limit:
+            break
+    return unique
+
+
+def _category_key(category: str) -> int:
+    """Stable index key for a preference category (hash() is salted per process)."""
+    return zlib.crc32(category.strip().lower().encode("utf-8"))
+
+
 class MemoryTools:
     """Tools for interacting with the Mem0 memory system."""
 
     def __init__(self, memory: Memory):
         self.memory = memory
+        self._local_indexes: Dict[str, LocalMemoryIndex] = {}
+        # Preferences are few per user, so they live entirely in RAM keyed by category
+        self._pref_indexes: Dict[str, LocalMemoryIndex] = {}
+        # One mirror reload per user at a time; concurrent searches wait for it
+        self._index_locks: Dict[str, threading.Lock] = {}
 
     def store_memory(self, content: str, user_id: str = "default_user") -> str:
         """Store information in memory."""
+        return self._store(content, user_id)
+
+    def store_preference(self, category: str, preference_text: str, user_id: str = "default_user") -> str:
+        """Store a preference, replacing the user's previous one for the category."""
+        return self._store(preference_text, user_id, preference_key=_category_key(category))
+
+    def _store(self, content: str, user_id: str, preference_key: Optional[int] = None) -> str:
         try:
-            self.memory.add(content, user_id=user_id)
-            return f"Stored memory: {content}"
+            result = self.memory.add(content, user_id=user_id)
         except Exception as e:
             return f"Error storing memory: {str(e)}"
 
+        # Mem0 may have added, updated or deleted several memories, so rather than
+        # embedding the text again the next search reloads the mirror from Pinecone
+        with self._index_lock(user_id):
+            self._local_indexes.pop(user_id, None)
+        if preference_key is not None:
+            self._mirror_preference(content, user_id, preference_key, result)
+        return f"Stored memory: {content}"
+
+    def _mirror_preference(self, content: str, user_id: str, key: int, result: Any) -> None:
+        """Index a preference under its category, reusing the vector Mem0 stored for it."""
+        ids = [
+            item["id"]
+            for item in (result or {}).get("results", [])
+            if item.get("event") in ("ADD", "UPDATE")
+        ]
+        vectors = self._fetch_vectors(ids[:1])
+        if not vectors:
+            # Nothing to reuse; preference searches for this user fall back to Mem0
+            self._pref_indexes.pop(user_id, None)
+            return
+        self._pref_indexes.setdefault(user_id, LocalMemoryIndex()).add(content, vectors[0], key=key)
+
+    def _pinecone_index(self) -> Any:
+        """The pinecone.Index behind Mem0, or None for other vector stores."""
+        return getattr(self.memory.vector_store, "index", None)
+
+    def _fetch_vectors(self, ids: List[str]) -> List[List[float]]:
+        pinecone_index = self._pinecone_index()
+        if pinecone_index is None or not ids:
+            return []
+        try:
+            response = pinecone_index.fetch(ids=ids)
+        except Exception as e:
+            logger.warning("Error fetching memory vectors: %s", e)
+            return []
+        return [response.vectors[i].values for i in ids if i in response.vectors]
+
+    def _index_lock(self, user_id: str) -> threading.Lock:
+        return self._index_locks.setdefault(user_id, threading.Lock())
+
+    def _local_index(self, user_id: str, vector: List[float]) -> LocalMemoryIndex:
+        """Return the user's local mirror, reloading it if missing or stale."""
+        index = self._local_indexes.get(user_id)
+        if index is not None and not index.is_stale():
+            return index
+
+        with self._index_lock(user_id):
+            # Another search may have reloaded it while this one waited
+            index = self._local_indexes.get(user_id)
+            if index is None or index.is_stale():
+                index = self._local_indexes[user_id] = self._load_local_index(user_id, vector)
+        return index
+
+    def _load_local_index(self, user_id: str, vector: List[float]) -> LocalMemoryIndex:
+        """Mirror the user's memories from the vectors Pinecone already stores.
+
+        A single query filtered to the user returns up to the cap plus one memory
+        with its text and vector, so nothing is re-embedded. If the mirror can't be
+        filled that way it is marked incomplete until stale and Mem0 is searched.
+        """
+        pinecone_index = self._pinecone_index()
+        if pinecone_index is None:
+            return LocalMemoryIndex(complete=False)
+        try:
+            response = pinecone_index.query(
+                vector=vector,
+                top_k=LOCAL_INDEX_MAX_MEMORIES + 1,
+                filter={"user_id": {"$eq": user_id}},
+                include_metadata=True,
+                include_values=True,
+            )
+        except Exception as e:
+            logger.warning("Error loading local memory index: %s", e)
+            return LocalMemoryIndex(complete=False)
+        if len(response.matches) > LOCAL_INDEX_MAX_MEMORIES:
+            return LocalMemoryIndex(complete=False)
+
+        index = LocalMemoryIndex()
+        for match in response.matches:
+            index.add(match.metadata["data"], match.values)
+        return index
+
+    def _search_local(self, query: str, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Answer a search from the local mirror, or return None to use Mem0."""
+        index = self._local_indexes.get(user_id)
+        if index is not None and not index.complete and not index.is_stale():
+            # Known not to fit; let Mem0 embed the query itself
+            return None
+
+        vector = self.memory.embedding_model.embed(query, "search")
+        index = self._local_index(user_id, vector)
+        if not index.complete:
+            return None
+        return {"results": [{"memory": text} for text in index.search_diverse(vector, limit)]}
+
     def search_memories(self, query: str, user_id: str = "default_user", limit: int = 5) -> str:
         """Search for relevant memories."""
         try:
-            results = self.memory.search(query, user_id=user_id, limit=limit)
-            if not results:
+            results = self._search_local(query, user_id, limit)
+            if results is None:
+                # Pinecone results carry no vectors, so only exact repeats are dropped
+                results = self.memory.search(query, user_id=user_id, limit=max(limit, MMR_CANDIDATES))
+                if results:
+                    results = {"results": _dedupe_memories(results["results"], limit)}
+            if not results or not results["results"]:
                 return "No relevant memories found."
 
-            memory_text = "Relevant memories found:\n"
-            for i, result in enumerate(results["results"]):
-                memory_text += f"{i}. {result['memory']}\n"
-            return memory_text
+            lines = ["Relevant memories found:"]
+            lines.extend(f"{i}. {result['memory']}" for i, result in enumerate(results["results"]))
+            return "\n".join(lines) + "\n"
         except Exception as e:
             return f"Error searching memories: {str(e)}"
 
+    def search_preferences(self, query: str, user_id: str = "default_user", limit: int = 5) -> str:
+        """Search the user's preferences, using Mem0 only if none are held locally."""
+        index = self._pref_indexes.get(user_id)
+        if not index:
+            return self.search_memories(query, user_id=user_id, limit=limit)
+
+        try:
+            vector = self.memory.embedding_model.embed(query, "search")
+            matches = index.search(vector, limit)
+        except Exception as e:
+            return f"Error searching memories: {str(e)}"
+
+        lines = ["Relevant memories found:"]
+        lines.extend(f"{i}. {text}" for i, text in enumerate(matches))
+        return "\n".join(lines) + "\n"
+
     def get_all_memories(self, user_id: str = "default_user") -> str:
         """Get all memories for a user."""
         try:
@@ -68,10 +312,9 @@ class MemoryTools:
             if not results:
                 return "No memories found for this user."
 
-            memory_text = "All memories for user:\n"
-            for i, result in enumerate(results["results"]):
-                memory_text += f"{i}. {result['memory']}\n"
-            return memory_text
+            lines = ["All memories for user:"]
+            lines.extend(f"{i}. {result['memory']}" for i, result in enumerate(results["results"]))
+            return "\n".join(lines) + "\n"
         except Exception as e:
             return f"Error retrieving memories: {str(e)}"
 
@@ -79,6 +322,9 @@ class MemoryTools:
         """Update an existing memory."""
         try:
             self.memory.update(memory_id, new_content)
+            # Memory ids are not tracked locally, so rebuild every mirror
+            self._local_indexes.clear()
+            self._pref_indexes.clear()
             return f"Updated memory with new content: {new_content}"
         except Exception as e:
             return f"Error updating memory: {str(e)}"
@@ -87,13 +333,23 @@ class MemoryTools:
         """Delete a specific memory."""
         try:
             self.memory.delete(memory_id)
+            self._local_indexes.clear()
+            self._pref_indexes.clear()
             return "Memory deleted successfully."
         except Exception as e:
             return f"Error deleting memory: {str(e)}"
 
+# (epoch second, formatted time); replaced as a whole so threads never see a torn pair
+_current_time_cache: Tuple[int, str] = (0, "")
+
+
 def get_current_time() -> str:
     """Get the current date and time."""
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    global _current_time_cache
+    second = int(time.time())
+    if _current_time_cache[0] != second:
+        _current_time_cache = (second, datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S"))
+    return _current_time_cache[1]
 
 
 
@@ -158,6 +414,31 @@ class MemoryQA(dspy.Signature):
     user_input: str = dspy.InputField()
     response: str = dspy.OutputField()
 
+# Parsed ReAct programs keyed by tool names; the tool functions are rebound per agent
+_react_templates: Dict[Tuple[str, ...], dspy.ReAct] = {}
+
+
+def _build_react(tools: List[Callable]) -> dspy.ReAct:
+    """Build a ReAct over tools, reusing the signature parsing of an earlier build."""
+    key = tuple(tool.__name__ for tool in tools)
+    template = _react_templates.get(key)
+    if template is None:
+        template = dspy.ReAct(
+            signature=MemoryQA,
+            tools=tools,
+            max_iters=6
+        )
+        _react_templates[key] = template
+
+    react = copy.copy(template)
+    react.react = template.react.deepcopy()
+    react.extract = template.extract.deepcopy()
+    react.tools = {name: copy.copy(tool) for name, tool in template.tools.items()}
+    for tool in tools:
+        react.tools[tool.__name__].func = tool
+    return react
+
+
 class MemoryReActAgent(dspy.Module):
     """A ReAct agent enhanced with Mem0 memory capabilities."""
 
@@ -177,11 +458,7 @@ class MemoryReActAgent(dspy.Module):
         ]
 
         # Initialize ReAct with our tools
-        self.react = dspy.ReAct(
-            signature=MemoryQA,
-            tools=self.tools,
-            max_iters=6
-        )
+        self.react = _build_react(self.tools)
 
     def forward(self, user_input: str):
         """Process user input with memory-aware reasoning."""
@@ -199,7 +476,7 @@ class MemoryReActAgent(dspy.Module):
     def get_preferences(self, category: str = "general", user_id: str = "default_user") -> str:
         """Get user preferences for a specific category."""
         query = f"user preferences {category}"
-        return self.memory_tools.search_memories(
+        return self.memory_tools.search_preferences(
             query=query,
             user_id=user_id
         )
@@ -207,14 +484,39 @@ class MemoryReActAgent(dspy.Module):
     def update_preferences(self, category: str, preference: str, user_id: str = "default_user") -> str:
         """Update user preferences."""
         preference_text = f"User preference for {category}: {preference}"
-        return self.memory_tools.store_memory(
+        return self.memory_tools.store_preference(
+            category,
             preference_text,
             user_id=user_id
         )
 
-lm = dspy.LM(model='openai/gpt-4o-mini')
-dspy.configure(lm=lm)
+# The LM, Mem0 client and agent are built on first use so importing this module
+# stays cheap; only one thread may call dspy.configure, hence the lock
+_agent: Optional[MemoryReActAgent] = None
+_async_agent: Optional[Callable] = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> MemoryReActAgent:
+    """Get or create the global agent instance."""
+    global _agent, _async_agent
+    with _agent_lock:
+        if _agent is None:
+            lm = dspy.LM(model='openai/gpt-4o-mini')
+            # JSONAdapter asks for one JSON object per ReAct step (json_object mode), which
+            # is terser and parses more reliably than the field-marker chat format.
+            # async_max_workers caps how many agent runs asyncify executes in parallel
+            dspy.configure(lm=lm, adapter=dspy.JSONAdapter(), async_max_workers=64)
+
+            memory = Memory.from_config(config)
+
+            agent = MemoryReActAgent(memory)
+            _async_agent = dspy.asyncify(agent)
+            _agent = agent
+    return _agent
 
-memory = Memory.from_config(config)
 
-agent = MemoryReActAgent(memory)
+def get_async_agent() -> Callable:
+    """Get the global agent wrapped for awaiting from the event loop."""
+    get_agent()
+    return _async_agent
@@ -1,18 +1,31 @@
+import asyncio
+import hmac
+import logging
 import os
-import threading
+import sys
 from typing import Optional
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI, HTTPException
+import httpx
+import msgspec
+import orjson
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from x402.fastapi.middleware import require_payment
 
+from clients.constants import HTTP_KEEPALIVE_EXPIRY_SECONDS, HTTP_MAX_KEEPALIVE_CONNECTIONS
+from clients.database import close_database_client
+from clients.log import configure_logging
 from clients.telegram import TelegramClient
+from clients.utils import parse_chat_id
 from schemas.app import SendRequest
 from cdp import CdpClient
 from dotenv import load_dotenv
 
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 cdp_client = CdpClient()
 
@@ -22,7 +35,32 @@ if not BOT_TOKEN:
 
 ALLOWED_CHAT_ID_ENV = os.getenv("TELEGRAM_ALLOWED_CHAT_ID")
 
-telegram_client = TelegramClient(BOT_TOKEN)
+# When set, Telegram pushes updates to this server instead of being long-polled
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+TELEGRAM_WEBHOOK_PATH = "/telegram/webhook"
+
+# One pooled HTTP/2 connection set to api.telegram.org, shared by every request
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    ),
+    timeout=10,
+)
+
+telegram_client = TelegramClient(BOT_TOKEN, http=http_client)
+
+# /send bodies are decoded by msgspec in one pass instead of building a pydantic model.
+# FastAPI never sees the body type, so the OpenAPI schema is published from msgspec's.
+_send_request_decoder = msgspec.json.Decoder(SendRequest)
+_SEND_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": msgspec.json.schema_components([SendRequest])[1]["SendRequest"]},
+    },
+}
 
 def _parse_allowed_chat_id(value: Optional[str]) -> Optional[int]:
     if not value:
@@ -33,27 +71,85 @@ def _parse_allowed_chat_id(value: Optional[str]) -> Optional[int]:
         raise RuntimeError("TELEGRAM_ALLOWED_CHAT_ID must be numeric if set")
 
 
+def _build_payment_middleware(pay_to_address: str):
+    return require_payment(
+        path="/send",
+        price="$0.001", 
+        pay_to_address=pay_to_address,
+        network="base-sepolia",
+        description="Send a secret signal with approval prompt to a Telegram user",
+        input_schema={
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Telegram @username or handle"},
+                "chat_id": {"type": "integer", "description": "Numeric chat ID"},
+                "message": {"type": "string", "description": "Secret message to send"},
+                "sender_handle": {"type": "string", "description": "Your handle to reveal after approval"}
+            },
+            "required": ["message"]
+        },
+        output_schema={
+            "type": "object",
+            "properties": {
+                "ok": {"type": "boolean"},
+                "chat_id": {"type": "integer"},
+                "message_id": {"type": "integer"},
+                "image_message_id": {"type": "integer"}
+            }
+        }
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     allowed_chat_id = _parse_allowed_chat_id(ALLOWED_CHAT_ID_ENV)
 
-    listener_thread = threading.Thread(
-        target=telegram_client.run_listener,
-        kwargs={
-            "allowed_chat_id": allowed_chat_id,
-            "prompt_text": "Approve this request?",
-        },
-        daemon=True,
-        name="telegram-listener-thread",
-    )
-    listener_thread.start()
+    # The payout wallet and x402 config never change, so resolve them once
+    app.state.wallet = await cdp_client.evm.get_or_create_account(name="FirstSignal")
+    app.state.payment_middleware = _build_payment_middleware(app.state.wallet.address)
+
+    listener_task: Optional[asyncio.Task] = None
+    if TELEGRAM_WEBHOOK_URL:
+        telegram_client.start_update_workers(
+            allowed_chat_id=allowed_chat_id,
+            prompt_text="Approve this request?",
+        )
+        await telegram_client.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+        )
+    else:
+        listener_task = asyncio.create_task(
+            telegram_client.run_listener(
+                allowed_chat_id=allowed_chat_id,
+                prompt_text="Approve this request?",
+            ),
+            name="telegram-listener",
+        )
     try:
         yield
     finally:
-        pass
-
-
-app = FastAPI(title="First Signal API", version="0.1.0", lifespan=lifespan)
+        if listener_task is not None:
+            listener_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await listener_task
+        await telegram_client.stop_update_workers()
+        await telegram_client.aclose()
+        await http_client.aclose()
+        # The Supabase pool lives as long as the app; closed here rather than left to exit
+        close_database_client()
+        # clients.blockchain (and web3) is only loaded once something was stored on chain
+        blockchain = sys.modules.get("clients.blockchain")
+        if blockchain is not None:
+            await blockchain.close_blockchain_client()
+
+
+app = FastAPI(
+    title="First Signal API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -83,39 +179,11 @@ app.add_middleware(
 
 @app.middleware("http")
 async def payment_middleware(request, call_next):
-    wallet = await cdp_client.evm.get_or_create_account(name="FirstSignal")
     if request.method == "OPTIONS":
         return await call_next(request)
 
     if request.url.path == "/send" and request.method == "POST":
-        payment_middleware_func = require_payment(
-            path="/send",
-            price="$0.001", 
-            pay_to_address=wallet.address,
-            network="base-sepolia",
-            description="Send a secret signal with approval prompt to a Telegram user",
-            input_schema={
-                "type": "object",
-                "properties": {
-                    "handle": {"type": "string", "description": "Telegram @username or handle"},
-                    "chat_id": {"type": "integer", "description": "Numeric chat ID"},
-                    "message": {"type": "string", "description": "Secret message to send"},
-                    "sender_handle": {"type": "string", "description": "Your handle to reveal after approval"}
-                },
-                "required": ["message"]
-            },
-            output_schema={
-                "type": "object",
-                "properties": {
-                    "ok": {"type": "boolean"},
-                    "chat_id": {"type": "integer"},
-                    "message_id": {"type": "integer"},
-                    "image_message_id": {"type": "integer"}
-                }
-            }
-        )
-        
-        response = await payment_middleware_func(request, call_next)
+        response = await request.app.state.payment_middleware(request, call_next)
         
         origin = request.headers.get("origin")
         if origin:
@@ -133,50 +201,88 @@ async def payment_middleware(request, call_next):
     else:
         return await call_next(request)
 
-def _resolve_chat_id(handle: Optional[str]) -> int:
+async def _resolve_chat_id(handle: Optional[str]) -> int:
     if not handle:
         raise ValueError("Provide either chat_id or handle")
 
     h = handle.strip()
 
-    if h.lstrip("-").isdigit():
-        return int(h)
+    chat_id = parse_chat_id(h)
+    if chat_id is not None:
+        return chat_id
 
-    result = telegram_client.find_registered_chat(h)
+    result = await telegram_client.find_registered_chat(h)
     if result is not None:
         return result
 
     raise ValueError(f"User '{h}' not found. The user needs to message the bot first to get registered, or provide a numeric chat_id instead of a username.")
 
 
+async def _lookup_sender_chat_id(sender_handle: Optional[str]) -> Optional[int]:
+    """Best-effort resolution of the sender; the callbacks retry it if this fails."""
+    if not sender_handle:
+        return None
+    try:
+        return await _resolve_chat_id(sender_handle)
+    except ValueError:
+        return None
+
+
+@app.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request) -> dict:
+    if TELEGRAM_WEBHOOK_SECRET:
+        token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token.encode(), TELEGRAM_WEBHOOK_SECRET.encode()):
+            raise HTTPException(status_code=403, detail="Invalid webhook secret")
+
+    try:
+        update = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    # Handled by the update workers; Telegram only needs a quick 200
+    await telegram_client.enqueue_webhook_update(update)
+    return {"ok": True}
+
+
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
-@app.post("/send")
-def send(payload: SendRequest) -> dict:
+@app.post("/send", openapi_extra={"requestBody": _SEND_REQUEST_BODY})
+async def send(request: Request) -> dict:
+    try:
+        payload = _send_request_decoder.decode(await request.body())
+    except msgspec.DecodeError as exc:
+        # ValidationError is a DecodeError too: bad JSON and a bad shape are both the client's fault
+        raise HTTPException(status_code=422, detail=str(exc))
+
     try:
-        print(payload)
-        resolved_chat_id = _resolve_chat_id(payload.handle)
-        print(resolved_chat_id)
+        resolved_chat_id = await _resolve_chat_id(payload.handle)
+        logger.debug("Resolved /send target %r to chat %s", payload.handle, resolved_chat_id)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
     try:
         image_url = "https://i.imgur.com/SeO2KFF.jpeg"
-        image_response = telegram_client.send_photo(
-            chat_id=str(resolved_chat_id),
-            photo=image_url
+        # The sender lookup only needs the payload, so run it while the photo uploads
+        image_response, sender_chat_id = await asyncio.gather(
+            telegram_client.send_photo(
+                chat_id=resolved_chat_id,
+                photo=image_url
+            ),
+            _lookup_sender_chat_id(payload.sender_handle),
         )
         image_message_id = image_response.get("result", {}).get("message_id")
 
-        api_response = telegram_client.send_decision_prompt(
+        api_response = await telegram_client.send_decision_prompt(
             chat_id=resolved_chat_id,
             prompt_text="Your secret admirer sent you a signal, do you want to open it?",
             initial_message_id=image_message_id,  # In case of two messages later for better UI
             pending_message=payload.message,
             image_message_id=image_message_id,
-            sender_handle=payload.sender_handle
+            sender_handle=payload.sender_handle,
+            sender_chat_id=sender_chat_id,
         )
         decision_message_id = api_response.get("result", {}).get("message_id")
 
@@ -190,6 +296,8 @@ def run() -> None:
 
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "2053"))
+    # uvicorn[standard] installs uvloop and httptools, which the default "auto"
+    # loop/http settings pick over asyncio's loop and the pure-Python h11 parser
     uvicorn.run(app, host=host, port=port, reload=False)
 
 
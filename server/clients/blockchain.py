@@ -1,9 +1,13 @@
+import asyncio
+import logging
 import os
-from typing import Optional, Dict, Any
-from web3 import Web3
-from dotenv import load_dotenv
+from typing import Optional, Dict, Any, List
 
-load_dotenv()
+import aiohttp
+from web3 import AsyncWeb3, Web3
+from web3.providers.rpc import AsyncHTTPProvider
+
+logger = logging.getLogger(__name__)
 
 
 class BlockchainClient:
@@ -11,6 +15,14 @@ class BlockchainClient:
     
     # Base Sepolia RPC URL
     BASE_SEPOLIA_RPC = "https://sepolia.base.org"
+
+    # Fixed gas settings for the store call
+    STORE_GAS_LIMIT = 100000
+    STORE_GAS_PRICE_GWEI = 20
+
+    # Keep-alive pool for JSON-RPC calls to the node
+    RPC_CONNECTION_LIMIT = 20
+    RPC_KEEPALIVE_SECONDS = 60
     
     # Smart contract ABI for FirstSignal
     CONTRACT_ABI = [
@@ -66,12 +78,9 @@ class BlockchainClient:
         if not self.contract_address:
             raise ValueError("SMART_CONTRACT_ADDRESS must be set in environment")
         
-        # Initialize Web3 connection
-        self.w3 = Web3(Web3.HTTPProvider(self.BASE_SEPOLIA_RPC))
-        
-        # Verify connection
-        if not self.w3.is_connected():
-            raise RuntimeError("Failed to connect to Base Sepolia network")
+        # Initialize Web3 connection; the pooled session is attached in connect()
+        self.w3 = AsyncWeb3(AsyncHTTPProvider(self.BASE_SEPOLIA_RPC))
+        self._session: Optional[aiohttp.ClientSession] = None
         
         # Get account from private key
         self.account = self.w3.eth.account.from_key(self.private_key)
@@ -81,10 +90,48 @@ class BlockchainClient:
             address=Web3.to_checksum_address(self.contract_address),
             abi=self.CONTRACT_ABI
         )
+
+        # Everything about a store transaction except its data and nonce is
+        # fixed, so resolve it once instead of per message
+        self._store_fn = self.contract.functions.store
+        self._chain_id: Optional[int] = None
+        self._gas_price = Web3.to_wei(self.STORE_GAS_PRICE_GWEI, 'gwei')
+
+        # Nonces are tracked locally and only re-read from the node after a failure
+        self._nonce_lock = asyncio.Lock()
+        self._nonce: Optional[int] = None
+
+    async def connect(self) -> None:
+        """Open the pooled RPC session and fetch the chain id and starting nonce."""
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.RPC_CONNECTION_LIMIT,
+                keepalive_timeout=self.RPC_KEEPALIVE_SECONDS,
+            )
+        )
+        await self.w3.provider.cache_async_session(self._session)
+
+        # Verify connection
+        if not await self.w3.is_connected():
+            await self.aclose()
+            raise RuntimeError("Failed to connect to Base Sepolia network")
+
+        # 'pending' counts transactions still in the mempool (e.g. from before a
+        # restart), matching _resync_nonce, so the first send doesn't reuse a nonce
+        self._chain_id, self._nonce = await asyncio.gather(
+            self.w3.eth.chain_id,
+            self.w3.eth.get_transaction_count(self.account.address, 'pending'),
+        )
         
-        print(f"Blockchain client initialized for account: {self.account.address}")
+        logger.info("Blockchain client initialized for account: %s", self.account.address)
+
+    async def aclose(self) -> None:
+        """Close the pooled RPC session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
     
-    def store_message(self, message: str) -> Dict[str, Any]:
+    async def store_message(self, message: str) -> Dict[str, Any]:
         """
         Store a message on the blockchain by calling the smart contract's store function.
         
@@ -98,42 +145,109 @@ class BlockchainClient:
             Exception: If the transaction fails
         """
         try:
-            # Build transaction
-            transaction = self.contract.functions.store(message).build_transaction({
-                'from': self.account.address,
-                'gas': 100000,  # Estimate gas limit
-                'gasPrice': self.w3.to_wei('20', 'gwei'),  # Set gas price
-                'nonce': self.w3.eth.get_transaction_count(self.account.address),
-            })
-            
-            # Sign transaction
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, self.private_key)
-            
-            # Send transaction
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-            
-            print(f"Transaction sent: {tx_hash.hex()}")
+            async with self._nonce_lock:
+                # Sign transaction
+                signed_txn = self._sign_store_transaction(message, self._nonce)
+
+                # Send transaction
+                try:
+                    tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+                except Exception:
+                    await self._resync_nonce()
+                    raise
+                self._nonce += 1
             
-            # Wait for transaction receipt
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+            logger.info("Transaction sent: %s", tx_hash.hex())
             
-            return {
-                "success": True,
-                "transaction_hash": tx_receipt.transactionHash.hex(),
-                "block_number": tx_receipt.blockNumber,
-                "gas_used": tx_receipt.gasUsed,
-                "message": message
-            }
+            return await self._await_store_receipt(message, tx_hash)
             
         except Exception as e:
-            print(f"Blockchain transaction failed: {e}")
+            logger.exception("Blockchain transaction failed")
             return {
                 "success": False,
                 "error": str(e),
                 "message": message
             }
+
+    async def store_messages_batch(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        Store several messages, submitting all of their transactions at once.
+
+        The messages get consecutive nonces, are signed up front and sent concurrently,
+        so the whole batch usually lands within a block or two instead of one per message.
+        
+        Args:
+            messages: The messages to store on the blockchain
+            
+        Returns:
+            One result dictionary per message, in order, shaped like store_message's
+        """
+        if not messages:
+            return []
+
+        async with self._nonce_lock:
+            signed_txns = [
+                self._sign_store_transaction(message, self._nonce + i)
+                for i, message in enumerate(messages)
+            ]
+            sent = await asyncio.gather(
+                *(self.w3.eth.send_raw_transaction(signed.raw_transaction) for signed in signed_txns),
+                return_exceptions=True,
+            )
+            if any(isinstance(tx_hash, Exception) for tx_hash in sent):
+                await self._resync_nonce()
+            else:
+                self._nonce += len(messages)
+
+        async def settle(message: str, tx_hash: Any) -> Dict[str, Any]:
+            try:
+                if isinstance(tx_hash, Exception):
+                    raise tx_hash
+                logger.info("Transaction sent: %s", tx_hash.hex())
+                return await self._await_store_receipt(message, tx_hash)
+            except Exception as e:
+                logger.exception("Blockchain transaction failed")
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "message": message
+                }
+
+        return list(await asyncio.gather(*(settle(m, h) for m, h in zip(messages, sent))))
+
+    def _sign_store_transaction(self, message: str, nonce: int) -> Any:
+        """Sign a store(message) transaction from the cached template."""
+        transaction = {
+            'to': self.contract.address,
+            'from': self.account.address,
+            'data': self._store_fn(message)._encode_transaction_data(),
+            'value': 0,
+            'gas': self.STORE_GAS_LIMIT,
+            'gasPrice': self._gas_price,
+            'nonce': nonce,
+            'chainId': self._chain_id,
+        }
+        return self.w3.eth.account.sign_transaction(transaction, self.private_key)
+
+    async def _await_store_receipt(self, message: str, tx_hash: Any) -> Dict[str, Any]:
+        """Wait for a store transaction to be mined and summarize it."""
+        tx_receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        return {
+            "success": True,
+            "transaction_hash": tx_receipt.transactionHash.hex(),
+            "block_number": tx_receipt.blockNumber,
+            "gas_used": tx_receipt.gasUsed,
+            "message": message
+        }
+    
+    async def _resync_nonce(self) -> None:
+        """Re-read the account nonce from the node; caller holds the nonce lock."""
+        try:
+            self._nonce = await self.w3.eth.get_transaction_count(self.account.address, 'pending')
+        except Exception:
+            logger.exception("Failed to resync nonce")
     
-    def retrieve_last_message(self) -> Optional[str]:
+    async def retrieve_last_message(self) -> Optional[str]:
         """
         Retrieve the last stored message from the smart contract.
         
@@ -141,13 +255,13 @@ class BlockchainClient:
             The last stored message or None if retrieval fails
         """
         try:
-            result = self.contract.functions.retrieveLast().call()
+            result = await self.contract.functions.retrieveLast().call()
             return result
-        except Exception as e:
-            print(f"Failed to retrieve last message: {e}")
+        except Exception:
+            logger.exception("Failed to retrieve last message")
             return None
     
-    def retrieve_all_messages(self) -> Optional[list]:
+    async def retrieve_all_messages(self) -> Optional[list]:
         """
         Retrieve all stored messages from the smart contract.
         
@@ -155,20 +269,34 @@ class BlockchainClient:
             List of all stored messages or None if retrieval fails
         """
         try:
-            result = self.contract.functions.retrieve().call()
+            result = await self.contract.functions.retrieve().call()
             return result
-        except Exception as e:
-            print(f"Failed to retrieve all messages: {e}")
+        except Exception:
+            logger.exception("Failed to retrieve all messages")
             return None
 
 
 # Global instance
 _blockchain_client: Optional[BlockchainClient] = None
+_blockchain_client_lock = asyncio.Lock()
 
 
-def get_blockchain_client() -> BlockchainClient:
+async def get_blockchain_client() -> BlockchainClient:
     """Get or create the global blockchain client instance."""
     global _blockchain_client
-    if _blockchain_client is None:
-        _blockchain_client = BlockchainClient()
-    return _blockchain_client 
\ No newline at end of file
+    if _blockchain_client is not None:
+        return _blockchain_client
+    async with _blockchain_client_lock:
+        if _blockchain_client is None:
+            client = BlockchainClient()
+            await client.connect()
+            _blockchain_client = client
+    return _blockchain_client
+
+
+async def close_blockchain_client() -> None:
+    """Close the global blockchain client if it was ever created."""
+    global _blockchain_client
+    if _blockchain_client is not None:
+        await _blockchain_client.aclose()
+        _blockchain_client = None
@@ -1 +1,77 @@
-TELEGRAM_API_BASE = "https://api.telegram.org"
\ No newline at end of file
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# getUpdates long-poll duration; kept under common proxy idle timeouts
+LONG_POLL_TIMEOUT_SECONDS = 25
+
+# Update types the bot handles, and the most fetched per getUpdates call
+ALLOWED_UPDATES = ["message", "callback_query"]
+UPDATES_BATCH_LIMIT = 100
+
+# Polled updates wait in a bounded queue for this many concurrent handlers
+UPDATE_QUEUE_SIZE = 256
+UPDATE_WORKERS = 8
+
+# Messages waiting for an agent reply, answered by their own workers so slow
+# LLM calls don't hold up button presses; beyond the queue size they get a
+# decision prompt instead
+AGENT_QUEUE_SIZE = 64
+AGENT_WORKERS = 4
+# How long messages skip the agent after it failed to build
+AGENT_RETRY_SECONDS = 60
+
+# Recent webhook update_ids remembered so Telegram's redeliveries are handled once
+SEEN_UPDATES_SIZE = 1024
+
+# Registered handle <-> chat_id lookups kept in memory
+HANDLE_CACHE_SIZE = 4096
+HANDLE_CACHE_TTL_SECONDS = 600
+
+# Agent follow-up advice remembered per distinct accepted-message prompt
+RECOMMENDATION_CACHE_SIZE = 512
+
+# Supabase read caches (registration misses, usernames)
+DB_CACHE_SIZE = 10000
+DB_CACHE_TTL_SECONDS = 300
+
+# Connection pool for api.telegram.org; idle connections are kept well past
+# httpx's 5s default so gaps between updates don't cost a new TLS handshake
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60
+
+# Rows fetched per request when listing every registered chat (PostgREST's default cap)
+REGISTERED_IDS_PAGE_SIZE = 1000
+
+# Decision prompts awaiting a button press; abandoned ones expire after an hour
+PENDING_CACHE_SIZE = 5000
+PENDING_TTL_SECONDS = 3600
+# Expired prompts are purged from the store once per this many updates
+PENDING_SWEEP_EVERY_UPDATES = 200
+
+# Sends in flight at once during a broadcast (Telegram allows ~30 messages/sec)
+BROADCAST_CONCURRENCY = 30
+# Bot API calls in flight at once across the whole client (getUpdates excluded)
+OUTBOUND_CONCURRENCY = 25
+
+# Token buckets kept under Telegram's limits: ~30 calls/sec overall and about
+# one message per second to a single chat. A chat's bucket holds a few sends, so
+# back-to-back pairs (photo then prompt) go out at once. A 429 is retried this
+# many times.
+GLOBAL_CALLS_PER_SECOND = 30
+CHAT_SENDS_PER_SECOND = 1
+CHAT_SEND_BURST = 3
+RATE_LIMIT_RETRIES = 2
+
+# Telegram's sendMessage text limit, and how long queued replies to one chat
+# wait for siblings to be joined into a single message
+MESSAGE_MAX_CHARS = 4096
+COALESCE_DELAY_SECONDS = 0.2
+# Extra rounds of RATE_LIMIT_RETRIES a queued reply gets before it is dropped
+COALESCE_REQUEUE_LIMIT = 2
+
+# Supabase (PostgREST) HTTP pool: 3 kept-alive connections plus 2 for bursts;
+# callers wait up to DB_POOL_TIMEOUT_SECONDS for a free connection
+DB_POOL_MAX_KEEPALIVE = 3
+DB_POOL_MAX_CONNECTIONS = 5
+DB_POOL_TIMEOUT_SECONDS = 30
+DB_POOL_RECYCLE_SECONDS = 1800
+DB_REQUEST_TIMEOUT_SECONDS = 10
@@ -1,11 +1,43 @@
+import logging
 import os
+import sys
+import threading
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import httpx
+from cachetools import TTLCache
+from postgrest import APIError
+from supabase import create_client, Client, ClientOptions
 
 from schemas.database import RegisteredUser
+from .constants import (
+    DB_CACHE_SIZE,
+    DB_CACHE_TTL_SECONDS,
+    DB_POOL_MAX_CONNECTIONS,
+    DB_POOL_MAX_KEEPALIVE,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_REQUEST_TIMEOUT_SECONDS,
+    HANDLE_CACHE_SIZE,
+    REGISTERED_IDS_PAGE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=HANDLE_CACHE_SIZE)
+def normalize_username(username: str) -> str:
+    """Normalize a handle the same way as the username_norm column: lowercase, no leading @.
+
+    Results are memoized and interned, so a handle seen again comes back as the same
+    str object and handle-cache lookups match by identity.
+    """
+    return sys.intern(username.strip().lower().lstrip("@"))
+
+
+class RetiredClientError(RuntimeError):
+    """Raised by DatabaseClient.call() once the client has been swapped out by a reconnect."""
 
-load_dotenv()
 
 class DatabaseClient:
     def __init__(self):
@@ -15,33 +47,124 @@ class DatabaseClient:
         if not self.supabase_url or not self.supabase_key:
             raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in environment")
         
-        self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        # PostgREST calls share one deliberately sized keep-alive pool instead of
+        # the library default, so bursts of lookups queue briefly rather than
+        # opening a fresh connection each
+        self._http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=DB_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=DB_POOL_RECYCLE_SECONDS,
+            ),
+            timeout=httpx.Timeout(DB_REQUEST_TIMEOUT_SECONDS, pool=DB_POOL_TIMEOUT_SECONDS),
+        )
+        self.client: Client = create_client(
+            self.supabase_url,
+            self.supabase_key,
+            options=ClientOptions(httpx_client=self._http),
+        )
+
+        # Hot-path read caches. Registration only changes through this client, so
+        # registered chats are remembered until unregistered; misses and usernames
+        # expire in case another process changed them.
+        self._cache_lock = threading.Lock()
+        self._registered_chats: set = set()
+        self._unregistered_chats: TTLCache = TTLCache(maxsize=DB_CACHE_SIZE, ttl=DB_CACHE_TTL_SECONDS)
+        self._usernames: TTLCache = TTLCache(maxsize=DB_CACHE_SIZE, ttl=DB_CACHE_TTL_SECONDS)
+
+        # Calls running on this client, so a retired client's pool is closed by the
+        # last of them rather than from under them
+        self._calls_lock = threading.Lock()
+        self._calls = 0
+        self._retired = False
+
+        # The user base is small enough to hold every registered id, so most
+        # registration checks never reach the database
+        try:
+            self._registered_chats.update(self.get_all_registered_ids())
+        except Exception:
+            logger.exception("Error preloading registered chats")
+
+    def close(self) -> None:
+        """Close the PostgREST connection pool."""
+        self._http.close()
+
+    def call(self, method: str, *args: Any) -> Any:
+        """Run one of this client's methods, counted so retire() knows when it is idle."""
+        with self._calls_lock:
+            if self._retired:
+                raise RetiredClientError("Database client was replaced after a connection failure")
+            self._calls += 1
+        try:
+            return getattr(self, method)(*args)
+        finally:
+            with self._calls_lock:
+                self._calls -= 1
+                idle = self._retired and not self._calls
+            if idle:
+                self.close()
+
+    def retire(self) -> None:
+        """Refuse new calls and close the pool once the calls in flight have returned."""
+        with self._calls_lock:
+            if self._retired:
+                return
+            self._retired = True
+            idle = not self._calls
+        if idle:
+            self.close()
+
+    def _forget_chat(self, chat_id: int) -> None:
+        with self._cache_lock:
+            self._registered_chats.discard(chat_id)
+            self._unregistered_chats.pop(chat_id, None)
+            self._usernames.pop(chat_id, None)
     
     def is_chat_registered(self, chat_id: int) -> bool:
         """Check if a chat_id is already registered in the database."""
+        with self._cache_lock:
+            if chat_id in self._registered_chats:
+                return True
+            if chat_id in self._unregistered_chats:
+                return False
+
         try:
-            response = self.client.table("registered_users").select("chat_id").eq("chat_id", chat_id).execute()
-            return len(response.data) > 0
-        except Exception as e:
-            print(f"Error checking if chat is registered: {e}")
+            # HEAD request: PostgREST only returns the count header, no row body
+            response = (
+                self.client.table("registered_users")
+                .select("chat_id", count="exact", head=True)
+                .eq("chat_id", chat_id)
+                .execute()
+            )
+            registered = (response.count or 0) > 0
+        except APIError:
+            logger.exception("Error checking if chat is registered")
             return False
+
+        with self._cache_lock:
+            if registered:
+                self._registered_chats.add(chat_id)
+            else:
+                self._unregistered_chats[chat_id] = True
+        return registered
     
     def register_chat(self, chat_id: int, username: Optional[str]) -> bool:
         """Register a new chat with optional username."""
         try:
-            # Check if already registered
-            if self.is_chat_registered(chat_id):
-                return True
-            
-            # Insert new user
+            # Single round-trip; an existing chat_id is left untouched
             data = {
                 "chat_id": chat_id,
                 "username": username or None
             }
-            response = self.client.table("registered_users").insert(data).execute()
-            return len(response.data) > 0
-        except Exception as e:
-            print(f"Error registering chat: {e}")
+            self.client.table("registered_users").upsert(
+                data, on_conflict="chat_id", ignore_duplicates=True
+            ).execute()
+            self._forget_chat(chat_id)
+            with self._cache_lock:
+                self._registered_chats.add(chat_id)
+            return True
+        except APIError:
+            logger.exception("Error registering chat")
             return False
     
     def find_chat_id_by_username(self, username: str) -> Optional[int]:
@@ -50,33 +173,56 @@ class DatabaseClient:
             return None
         
         try:
-            # Normalize username
-            normalized = username.lower().lstrip("@")
-            
-            response = self.client.table("registered_users").select("chat_id, username").ilike("username", f"%{normalized}%").execute()
+            normalized = normalize_username(username)
             
-            # Find exact match (case-insensitive)
-            for user in response.data:
-                stored_username = user.get("username")
-                if stored_username and stored_username.lower().lstrip("@") == normalized:
-                    return user["chat_id"]
+            response = (
+                self.client.table("registered_users")
+                .select("chat_id")
+                .eq("username_norm", normalized)
+                .limit(1)
+                .execute()
+            )
+            if response.data:
+                return response.data[0]["chat_id"]
             
             return None
-        except Exception as e:
-            print(f"Error finding chat by username: {e}")
+        except APIError:
+            logger.exception("Error finding chat by username")
             return None
     
     def get_username_by_chat_id(self, chat_id: int) -> Optional[str]:
         """Find a username by chat_id."""
+        with self._cache_lock:
+            if chat_id in self._usernames:
+                return self._usernames[chat_id]
+
         try:
             response = self.client.table("registered_users").select("username").eq("chat_id", chat_id).execute()
-            if response.data:
-                return response.data[0].get("username")
-            return None
-        except Exception as e:
-            print(f"Error finding username by chat_id: {e}")
+            username = response.data[0].get("username") if response.data else None
+            with self._cache_lock:
+                self._usernames[chat_id] = username
+            return username
+        except APIError:
+            logger.exception("Error finding username by chat_id")
             return None
     
+    def get_all_registered_ids(self) -> List[int]:
+        """Get the chat_id of every registered user, paging past PostgREST's row cap."""
+        chat_ids: List[int] = []
+        start = 0
+        while True:
+            response = (
+                self.client.table("registered_users")
+                .select("chat_id")
+                .order("chat_id")
+                .range(start, start + REGISTERED_IDS_PAGE_SIZE - 1)
+                .execute()
+            )
+            chat_ids.extend(row["chat_id"] for row in response.data)
+            if len(response.data) < REGISTERED_IDS_PAGE_SIZE:
+                return chat_ids
+            start += REGISTERED_IDS_PAGE_SIZE
+    
     def get_all_registered_users(self) -> List[RegisteredUser]:
         """Get all registered users from the database."""
         try:
@@ -89,8 +235,8 @@ class DatabaseClient:
                 )
                 for user in response.data
             ]
-        except Exception as e:
-            print(f"Error getting all registered users: {e}")
+        except APIError:
+            logger.exception("Error getting all registered users")
             return []
     
     def update_username(self, chat_id: int, username: Optional[str]) -> bool:
@@ -99,28 +245,58 @@ class DatabaseClient:
             response = self.client.table("registered_users").update({
                 "username": username
             }).eq("chat_id", chat_id).execute()
+            with self._cache_lock:
+                self._usernames.pop(chat_id, None)
             return len(response.data) > 0
-        except Exception as e:
-            print(f"Error updating username: {e}")
+        except APIError:
+            logger.exception("Error updating username")
             return False
     
     def unregister_chat(self, chat_id: int) -> bool:
         """Remove a chat from registered users."""
         try:
             response = self.client.table("registered_users").delete().eq("chat_id", chat_id).execute()
+            self._forget_chat(chat_id)
             return len(response.data) > 0
-        except Exception as e:
-            print(f"Error unregistering chat: {e}")
+        except APIError:
+            logger.exception("Error unregistering chat")
             return False
 
 
-# Global database client instance
+# Global database client instance; callers build it from worker threads, so
+# creation is locked to keep concurrent first calls from each opening a pool
 _db_client: Optional[DatabaseClient] = None
+_db_client_lock = threading.Lock()
 
 
 def get_database_client() -> DatabaseClient:
     """Get or create the global database client instance."""
     global _db_client
-    if _db_client is None:
-        _db_client = DatabaseClient()
-    return _db_client 
\ No newline at end of file
+    with _db_client_lock:
+        if _db_client is None:
+            _db_client = DatabaseClient()
+        return _db_client
+
+
+def reset_database_client(failed: DatabaseClient) -> None:
+    """Discard a client whose connection broke so the next get_database_client() reconnects.
+
+    Other threads may still be mid-request on it, so its pool is closed when the
+    last of them returns.
+    """
+    global _db_client
+    with _db_client_lock:
+        # Several threads can fail on the same client; only the first swaps it out
+        if _db_client is not failed:
+            return
+        _db_client = None
+    failed.retire()
+
+
+def close_database_client() -> None:
+    """Close and discard the global client; for application shutdown."""
+    global _db_client
+    with _db_client_lock:
+        client, _db_client = _db_client, None
+    if client is not None:
+        client.close()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, Tuple
+
+import orjson
+from cachetools import TLRUCache
+
+from schemas.telegram import Pending
+from .constants import PENDING_CACHE_SIZE, PENDING_TTL_SECONDS
+
+# (chat_id, initial_message_id) of the decision prompt a record belongs to
+PendingKey = Tuple[int, Optional[int]]
+
+
+def _key_str(key: PendingKey) -> str:
+    chat_id, initial_message_id = key
+    return f"{chat_id}:{initial_message_id if initial_message_id is not None else ''}"
+
+
+class PendingStore(ABC):
+    """Where decision prompts wait for the recipient's button presses.
+
+    Records expire ttl seconds after each set(). Callers that change a record must
+    set() it again; only the in-memory store hands out live objects.
+    """
+
+    @abstractmethod
+    async def get(self, key: PendingKey) -> Optional[Pending]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: PendingKey, value: Pending, ttl: int = PENDING_TTL_SECONDS) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: PendingKey) -> None:
+        ...
+
+    async def sweep(self) -> None:
+        """Drop expired records that reads alone would leave behind."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MemoryPendingStore(PendingStore):
+    """Process-local store; the default when only one worker handles updates."""
+
+    def __init__(self, maxsize: int = PENDING_CACHE_SIZE):
+        # Records are stored with their own ttl, so expiry matches the shared stores
+        self._records: "TLRUCache[PendingKey, Tuple[Pending, int]]" = TLRUCache(
+            maxsize=maxsize, ttu=lambda _key, record, now: now + record[1]
+        )
+
+    async def get(self, key: PendingKey) -> Optional[Pending]:
+        record = self._records.get(key)
+        return record[0] if record is not None else None
+
+    async def set(self, key: PendingKey, value: Pending, ttl: int = PENDING_TTL_SECONDS) -> None:
+        self._records[key] = (value, ttl)
+
+    async def delete(self, key: PendingKey) -> None:
+        self._records.pop(key, None)
+
+    async def sweep(self) -> None:
+        self._records.expire()
+
+
+class RedisPendingStore(PendingStore):
+    """Shared store for several workers; expiry is left to Redis (SETEX)."""
+
+    KEY_PREFIX = "firstsignal:pending:"
+
+    def __init__(self, url: str):
+        # Optional dependency, only needed when REDIS_URL is set
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    async def get(self, key: PendingKey) -> Optional[Pending]:
+        raw = await self._redis.get(self.KEY_PREFIX + _key_str(key))
+        return Pending(**orjson.loads(raw)) if raw is not None else None
+
+    async def set(self, key: PendingKey, value: Pending, ttl: int = PENDING_TTL_SECONDS) -> None:
+        await self._redis.setex(self.KEY_PREFIX + _key_str(key), ttl, orjson.dumps(value))
+
+    async def delete(self, key: PendingKey) -> None:
+        await self._redis.delete(self.KEY_PREFIX + _key_str(key))
+
+    async def aclose(self) -> None:
+        await self._redis.aclose()
+
+
+class SQLitePendingStore(PendingStore):
+    """Shared store for workers on one host, without running Redis."""
+
+    # Fixed SQL strings, so sqlite3's per-connection statement cache parses each only once
+    _GET_SQL = "SELECT value FROM pending_messages WHERE key = ? AND expires_at > ?"
+    _SET_SQL = "INSERT OR REPLACE INTO pending_messages (key, value, expires_at) VALUES (?, ?, ?)"
+    _DELETE_SQL = "DELETE FROM pending_messages WHERE key = ?"
+    _SWEEP_SQL = "DELETE FROM pending_messages WHERE expires_at <= ?"
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Calls handed to worker threads and not yet finished; aclose() waits for them
+        self._idle = threading.Condition()
+        self._calls = 0
+        self._closed = False
+        # WAL lets other workers read while one writes; NORMAL sync is durable enough
+        # for prompts that expire within the hour
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Wait out another worker's write lock instead of failing with "database is locked"
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_messages ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pending_messages_expires_at ON pending_messages(expires_at)"
+            )
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(self._GET_SQL, (key, int(time.time()))).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, expires_at: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(self._SET_SQL, (key, value, expires_at))
+
+    def _delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(self._DELETE_SQL, (key,))
+
+    def _sweep(self, now: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(self._SWEEP_SQL, (now,))
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return fn(*args)
+        finally:
+            with self._idle:
+                self._calls -= 1
+                self._idle.notify_all()
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn in a worker thread, counted from before it is queued until it returns."""
+        with self._idle:
+            if self._closed:
+                raise RuntimeError("Pending store is closed")
+            self._calls += 1
+        # A cancelled caller stops waiting but the thread still finishes and is counted
+        return await asyncio.to_thread(self._call, fn, *args)
+
+    async def get(self, key: PendingKey) -> Optional[Pending]:
+        raw = await self._run(self._get, _key_str(key))
+        return Pending(**orjson.loads(raw)) if raw is not None else None
+
+    async def set(self, key: PendingKey, value: Pending, ttl: int = PENDING_TTL_SECONDS) -> None:
+        await self._run(self._set, _key_str(key), orjson.dumps(value).decode(), int(time.time()) + ttl)
+
+    async def delete(self, key: PendingKey) -> None:
+        await self._run(self._delete, _key_str(key))
+
+    async def sweep(self) -> None:
+        # get() already ignores expired rows; this keeps the table from growing
+        await self._run(self._sweep, int(time.time()))
+
+    def _close(self) -> None:
+        with self._idle:
+            self._idle.wait_for(lambda: not self._calls)
+        with self._lock:
+            self._conn.close()
+
+    async def aclose(self) -> None:
+        """Refuse new calls, then close the connection once those in flight have finished."""
+        with self._idle:
+            if self._closed:
+                return
+            self._closed = True
+        await asyncio.to_thread(self._close)
+
+
+def create_pending_store() -> PendingStore:
+    """Pick the store from the environment: Redis, then SQLite, else in-memory."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        return RedisPendingStore(redis_url)
+    sqlite_path = os.getenv("PENDING_DB_PATH")
+    if sqlite_path:
+        return SQLitePendingStore(sqlite_path)
+    return MemoryPendingStore()
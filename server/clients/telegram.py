@@ -1,115 +1,465 @@
-import json
+import asyncio
+import hashlib
+import logging
 import os
+import re
 import sys
-import urllib.error
-import urllib.request
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
-from dotenv import load_dotenv
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple, Union
 
-from .database import get_database_client
-from .constants import TELEGRAM_API_BASE
-from .blockchain import get_blockchain_client
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from cachetools import LRUCache, TTLCache
 
-load_dotenv()
+from schemas.telegram import Pending
+from .database import (
+    DatabaseClient,
+    RetiredClientError,
+    get_database_client,
+    normalize_username,
+    reset_database_client,
+)
+from .pending import PendingStore, create_pending_store
+from .utils import parse_chat_id
+from .constants import (
+    AGENT_QUEUE_SIZE,
+    AGENT_RETRY_SECONDS,
+    AGENT_WORKERS,
+    ALLOWED_UPDATES,
+    BROADCAST_CONCURRENCY,
+    CHAT_SEND_BURST,
+    CHAT_SENDS_PER_SECOND,
+    COALESCE_DELAY_SECONDS,
+    COALESCE_REQUEUE_LIMIT,
+    GLOBAL_CALLS_PER_SECOND,
+    HANDLE_CACHE_SIZE,
+    HANDLE_CACHE_TTL_SECONDS,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    LONG_POLL_TIMEOUT_SECONDS,
+    MESSAGE_MAX_CHARS,
+    OUTBOUND_CONCURRENCY,
+    PENDING_SWEEP_EVERY_UPDATES,
+    RATE_LIMIT_RETRIES,
+    RECOMMENDATION_CACHE_SIZE,
+    SEEN_UPDATES_SIZE,
+    TELEGRAM_API_BASE,
+    UPDATE_QUEUE_SIZE,
+    UPDATE_WORKERS,
+    UPDATES_BATCH_LIMIT,
+)
 
-# Import agent - adding parent directory to path to import from root
-try:
-    import sys
-    import os
-    # Add the parent directory (server/) to Python path
-    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    if parent_dir not in sys.path:
-        sys.path.insert(0, parent_dir)
-    from agent import agent
-    print("Successfully imported agent")
-except ImportError as e:
-    print(f"Warning: Could not import agent: {e}")
-    agent = None
+logger = logging.getLogger(__name__)
 
+# The agent lives in server/agent.py; make it importable when run as clients.telegram
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
 
+# Bodies are encoded/decoded with orjson rather than httpx's stdlib json
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Bot API methods this client calls; their URLs are precomputed per client
+BOT_API_METHODS = (
+    "sendMessage",
+    "sendPhoto",
+    "getChat",
+    "setWebhook",
+    "deleteWebhook",
+    "getUpdates",
+    "answerCallbackQuery",
+    "editMessageText",
+    "deleteMessage",
+)
+
+
+class TelegramRetryAfter(RuntimeError):
+    """Telegram rejected a call with 429; it may be retried after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AgentResponse(Protocol):
+    """What the agent returns: a dspy Prediction of agent.MemoryQA, whose output field is response."""
+
+    response: str
+
+
+AsyncAgent = Callable[..., Awaitable[AgentResponse]]
+
+# dspy/mem0 are only imported, and the agent only built, once a message needs it
+_async_agent: Optional[AsyncAgent] = None
+_agent_unavailable = False
+# After a failed build, messages skip the agent until this time.monotonic() deadline
+_agent_retry_at = 0.0
+
+
+def _import_async_agent() -> AsyncAgent:
+    from agent import get_async_agent
+    return get_async_agent()
+
+
+async def _load_async_agent() -> Optional[AsyncAgent]:
+    """Return the async agent, building it off the event loop on first use."""
+    global _async_agent, _agent_unavailable, _agent_retry_at
+    if _async_agent is None and not _agent_unavailable and time.monotonic() >= _agent_retry_at:
+        try:
+            _async_agent = await asyncio.to_thread(_import_async_agent)
+            logger.info("Successfully imported agent")
+        except ImportError as e:
+            logger.warning("Could not import agent: %s", e)
+            _agent_unavailable = True
+        except Exception:  # noqa: BLE001
+            # e.g. missing API keys or an unreachable Pinecone; try again later rather than per message
+            logger.exception("Could not build agent; retrying in %ss", AGENT_RETRY_SECONDS)
+            _agent_retry_at = time.monotonic() + AGENT_RETRY_SECONDS
+    return _async_agent
+
+
+async def _get_blockchain_client() -> Any:
+    # web3 is only imported once a message is actually stored on chain
+    from .blockchain import get_blockchain_client
+    return await get_blockchain_client()
+
+
+async def _log_failure(label: str, awaitable: Awaitable[Any]) -> Any:
+    """Await a Bot API call, logging a failure instead of raising so gathered siblings still run."""
+    try:
+        return await awaitable
+    except Exception:  # noqa: BLE001
+        logger.exception("%s", label)
+        return None
+
+
+Action = Tuple[str, Awaitable[Any]]
+
+
+async def _flush_actions(actions: List[Action]) -> None:
+    """Dispatch a callback's independent (error label, call) actions concurrently, logging each failure."""
+    await asyncio.gather(*(_log_failure(label, awaitable) for label, awaitable in actions))
+
+
+async def _store_on_chain(message: str) -> Dict[str, Any]:
+    """Store an accepted message on chain, reporting failures in the result instead of raising."""
+    try:
+        blockchain_client = await _get_blockchain_client()
+        blockchain_result = await blockchain_client.store_message(message)
+        logger.info("Blockchain transaction result: %s", blockchain_result)
+        return blockchain_result
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Failed to store message on blockchain")
+        return {"success": False, "error": str(exc)}
+
+
+# Decision buttons carry a one-letter action code (Telegram caps callback_data at 64 bytes).
+# The long names are still accepted so prompts sent before the switch keep working.
+_CALLBACK_CODES = {"open": "o", "ignore": "i", "accept": "a", "decline_accept": "d"}
+_CALLBACK_ACTIONS = {code: action for action, code in _CALLBACK_CODES.items()}
+_CALLBACK_ACTIONS.update({action: action for action in _CALLBACK_CODES})
+# "<code>[:<initial_message_id>]", matched in one pass; anything else is not ours
+_CALLBACK_RE = re.compile(
+    r"(%s)(?::(-?\d+))?" % "|".join(map(re.escape, _CALLBACK_ACTIONS))
+)
+
+
+# Static keyboards are serialized once; orjson embeds a Fragment's bytes as-is
+_WELCOME_TEXT = "Welcome to First Signal! Tap the button below to register and start receiving signals. ⏈"
+_WELCOME_MARKUP = orjson.Fragment(orjson.dumps({
+    "inline_keyboard": [
+        [
+            {"text": "Register to check", "callback_data": "register"},
+        ]
+    ]
+}))
+_DECISION_MARKUP_TEMPLATE = orjson.dumps({
+    "inline_keyboard": [
+        [
+            {"text": "Yes ✅", "callback_data": "%s"},
+            {"text": "No ❌", "callback_data": "%s"},
+        ]
+    ]
+})
+_ACCEPT_MARKUP_TEMPLATE = orjson.dumps({
+    "inline_keyboard": [
+        [
+            {"text": "Accept ✅", "callback_data": "%s"},
+            {"text": "Decline ❌", "callback_data": "%s"},
+        ]
+    ]
+})
+
+
+def _callback_data(action: str, initial_message_id: Optional[int]) -> str:
+    code = _CALLBACK_CODES[action]
+    return code if initial_message_id is None else code + ":" + str(initial_message_id)
+
+
+def _parse_cb(data: str) -> Tuple[Optional[str], Optional[int]]:
+    """Split callback data into (action, initial_message_id); unrecognised data maps to (None, None)."""
+    match = _CALLBACK_RE.fullmatch(data)
+    if match is None:
+        return None, None
+    code, initial_id = match.groups()
+    return _CALLBACK_ACTIONS[code], int(initial_id) if initial_id else None
+
+
+def _split_message(text: str) -> List[str]:
+    """Split text into sendMessage-sized chunks, at the last newline before the limit where possible."""
+    chunks = []
+    while len(text) > MESSAGE_MAX_CHARS:
+        cut = text.rfind("\n", 0, MESSAGE_MAX_CHARS + 1)
+        if cut <= 0:
+            chunks.append(text[:MESSAGE_MAX_CHARS])
+            text = text[MESSAGE_MAX_CHARS:]
+        else:
+            chunks.append(text[:cut])
+            text = text[cut + 1:]
+    chunks.append(text)
+    return chunks
 
 
 class TelegramClient:
     """Telegram Bot API client with database integration for chat management."""
     
-    def __init__(self, token: str):
+    def __init__(self, token: str, http: Optional[httpx.AsyncClient] = None, pending_store: Optional[PendingStore] = None):
         """Initialize the Telegram client with a bot token.
         
         Args:
             token: Telegram bot token from BotFather
+            http: Shared connection pool; a private one is created if omitted
+            pending_store: Where open decision prompts are kept; chosen from the environment if omitted
         """
         if not token:
             raise ValueError("Telegram bot token is required")
         self._token = token
-        # Store for pending messages that are waiting for user approval
-        self._pending_messages: Dict[str, str] = {}
+        # Endpoint URLs are built once rather than formatted on every call
+        base_url = f"{TELEGRAM_API_BASE}/bot{token}"
+        self._urls: Dict[str, str] = {method: f"{base_url}/{method}" for method in BOT_API_METHODS}
+        self._owns_http = http is None
+        if http is None:
+            http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+            )
+        self._http = http
+        # Caps concurrent outbound calls so bursts of updates stay under Telegram's ~30/s limit
+        self._outbound = asyncio.Semaphore(OUTBOUND_CONCURRENCY)
+        # Throttle to Telegram's rate limits up front instead of paying retry_after penalties;
+        # sends are also limited per chat (one bucket per recently messaged chat)
+        self._global_limiter = AsyncLimiter(GLOBAL_CALLS_PER_SECOND, 1.0)
+        self._chat_limiters: "LRUCache[Any, AsyncLimiter]" = LRUCache(maxsize=HANDLE_CACHE_SIZE)
+        self._send_urls = frozenset((self._urls["sendMessage"], self._urls["sendPhoto"]))
+        # Replies queued per chat_id, the timers that will flush them as one
+        # message, and the sends in flight
+        self._out_buffers: Dict[int, List[str]] = {}
+        self._out_flushes: Dict[int, asyncio.TimerHandle] = {}
+        self._out_sends: set = set()
+        # Pending messages waiting for user approval, keyed by (chat_id, initial_message_id).
+        # One record serves every stage of the flow; abandoned prompts expire.
+        self._pending_messages: PendingStore = pending_store or create_pending_store()
+        # Chats known to be registered; only unregister_chat removes them
+        self._registered_chats: set = set()
+        # One in-flight registration per chat_id
+        self._register_locks: Dict[int, asyncio.Lock] = {}
+        # handle -> chat_id for registered users (only hits are cached) and
+        # chat_id -> username, both LRU with a TTL so edits made elsewhere age out
+        self._handle_cache: "TTLCache[str, int]" = TTLCache(maxsize=HANDLE_CACHE_SIZE, ttl=HANDLE_CACHE_TTL_SECONDS)
+        self._username_cache: "TTLCache[int, Optional[str]]" = TTLCache(maxsize=HANDLE_CACHE_SIZE, ttl=HANDLE_CACHE_TTL_SECONDS)
+        # Agent advice keyed by a digest of the prompt; identical accepts skip the LLM call
+        self._recommendations: "LRUCache[bytes, str]" = LRUCache(maxsize=RECOMMENDATION_CACHE_SIZE)
+        # Incoming updates waiting for the worker tasks
+        self._updates_queue: asyncio.Queue = asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE)
+        self._update_workers: List[asyncio.Task] = []
+        # (chat_id, text, prompt_text) of messages waiting for the agent workers
+        self._agent_queue: "asyncio.Queue[Tuple[int, str, str]]" = asyncio.Queue(maxsize=AGENT_QUEUE_SIZE)
+        self._agent_workers: List[asyncio.Task] = []
+        # update_ids already accepted from the webhook
+        self._seen_updates: "LRUCache[int, bool]" = LRUCache(maxsize=SEEN_UPDATES_SIZE)
+        # Updates seen since the last sweep of expired pending prompts
+        self._updates_since_sweep = 0
+        # Shared DatabaseClient, resolved in a thread on first use
+        self._db: Optional[DatabaseClient] = None
     
     # Public API methods
+
+    async def _get_db(self) -> DatabaseClient:
+        # Building the client connects and preloads every registered id, so never on the loop
+        if self._db is None:
+            self._db = await asyncio.to_thread(get_database_client)
+        return self._db
+
+    async def _db_call(self, method: str, *args: Any) -> Any:
+        """Run a DatabaseClient method in a thread, reconnecting once if the connection is broken."""
+        db = await self._get_db()
+        try:
+            return await asyncio.to_thread(db.call, method, *args)
+        except (httpx.TransportError, RetiredClientError):
+            # RetiredClientError: another caller already reconnected after a failure on db
+            logger.warning("Database connection failed during %s; reconnecting", method)
+            # Swapped in a thread: get_database_client holds the same lock while connecting
+            await asyncio.to_thread(reset_database_client, db)
+            if self._db is db:
+                self._db = None
+            db = await self._get_db()
+            return await asyncio.to_thread(db.call, method, *args)
+
+    async def aclose(self) -> None:
+        """Send queued replies, then close the pending store and the HTTP pool if this client created it."""
+        for chat_id in list(self._out_buffers):
+            self._flush_queued_text(chat_id)
+        await asyncio.gather(*self._out_sends, return_exceptions=True)
+        await self._pending_messages.aclose()
+        if self._owns_http:
+            await self._http.aclose()
     
-    def _resolve_chat_id(self, handle: Optional[str]) -> int:
+    async def _resolve_chat_id(self, handle: Optional[str]) -> int:
         if not handle:
             raise ValueError("Provide either chat_id or handle")
 
         h = handle.strip()
 
-        if h.lstrip("-").isdigit():
-            return int(h)
+        chat_id = parse_chat_id(h)
+        if chat_id is not None:
+            return chat_id
 
-        result = self.find_registered_chat(h)
+        result = await self.find_registered_chat(h)
         if result is not None:
             return result
 
         raise ValueError(f"User '{h}' not found. The user needs to message the bot first to get registered, or provide a numeric chat_id instead of a username.")
 
-    def is_chat_registered(self, chat_id: int) -> bool:
+    async def _resolve_sender_chat_id(self, pending_message_data: Pending) -> int:
+        """Return the sender's chat id, reusing the one resolved at send time if present."""
+        sender_chat_id = pending_message_data.sender_chat_id
+        if sender_chat_id is not None:
+            return sender_chat_id
+        return await self._resolve_chat_id(pending_message_data.sender_handle)
+
+    async def _get_pending(self, chat_id: int, initial_message_id: Optional[int], stage: str) -> Optional[Pending]:
+        """Return the pending record for a prompt if it is still at the given stage."""
+        pending_message_data = await self._pending_messages.get((chat_id, initial_message_id))
+        if pending_message_data is None or pending_message_data.stage != stage:
+            return None
+        return pending_message_data
+
+    async def is_chat_registered(self, chat_id: int) -> bool:
         """Return True if the chat_id is already registered in the database."""
+        # Chats registered through this client skip the database thread hop entirely
+        if chat_id in self._registered_chats:
+            return True
         try:
-            db = get_database_client()
-            return db.is_chat_registered(chat_id)
-        except Exception as e:
-            print(f"Error checking registration status: {e}")
+            registered = await self._db_call("is_chat_registered", chat_id)
+            if registered:
+                self._registered_chats.add(chat_id)
+            return registered
+        except Exception:
+            logger.exception("Error checking registration status")
             return False
 
-    def register_chat(self, chat_id: int, username: Optional[str]) -> None:
+    async def register_chat(self, chat_id: int, username: Optional[str]) -> None:
         """Register a chat with the associated user handle (may be None)."""
+        # Repeated taps and redelivered updates wait for the registration already in
+        # flight for this chat instead of issuing their own write
+        lock = self._register_locks.setdefault(chat_id, asyncio.Lock())
+        try:
+            async with lock:
+                if chat_id in self._registered_chats:
+                    return
+                success = await self._db_call("register_chat", chat_id, username)
+                self._invalidate_handle_cache(chat_id, username)
+                if success:
+                    self._registered_chats.add(chat_id)
+                    self._remember_handle(chat_id, username)
+                else:
+                    logger.error("Failed to register chat %s", chat_id)
+        except Exception:
+            logger.exception("Error registering chat")
+        finally:
+            if not lock.locked() and self._register_locks.get(chat_id) is lock:
+                del self._register_locks[chat_id]
+
+    async def unregister_chat(self, chat_id: int) -> bool:
+        """Remove a chat's registration, dropping every cached lookup for it."""
+        # Forgotten first, so a concurrent check goes to the database rather than the stale set
+        self._registered_chats.discard(chat_id)
+        self._invalidate_handle_cache(chat_id, None)
         try:
-            db = get_database_client()
-            success = db.register_chat(chat_id, username)
-            if not success:
-                print(f"Failed to register chat {chat_id}")
-        except Exception as e:
-            print(f"Error registering chat: {e}")
-
-    def find_registered_chat(self, handle: str) -> Optional[int]:
+            return await self._db_call("unregister_chat", chat_id)
+        except Exception:
+            logger.exception("Error unregistering chat")
+            return False
+
+    async def find_registered_chat(self, handle: str) -> Optional[int]:
         """Find a chat_id by username from the database."""
+        key = normalize_username(handle)
+        cached = self._handle_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            db = get_database_client()
-            result = db.find_chat_id_by_username(handle)
-            return result
-        except Exception as e:
-            print(f"Error finding chat by handle: {e}")
+            result = await self._db_call("find_chat_id_by_username", handle)
+        except Exception:
+            logger.exception("Error finding chat by handle")
             return None
 
-    def send_message(
+        if result is not None:
+            self._handle_cache[key] = result
+        return result
+
+    async def get_username(self, chat_id: int) -> Optional[str]:
+        """Return the registered username for chat_id, or None."""
+        try:
+            return self._username_cache[chat_id]
+        except KeyError:
+            pass
+        try:
+            username = await self._db_call("get_username_by_chat_id", chat_id)
+        except Exception:
+            logger.exception("Error getting username")
+            return None
+        self._username_cache[chat_id] = username
+        return username
+
+    def _remember_handle(self, chat_id: int, username: Optional[str]) -> None:
+        """Cache a registered chat's current handle, so /send to it skips the database."""
+        if username:
+            self._handle_cache[normalize_username(username)] = chat_id
+            self._username_cache[chat_id] = username
+
+    def _invalidate_handle_cache(self, chat_id: int, username: Optional[str]) -> None:
+        """Drop cached lookups that a (re-)registration may have changed."""
+        self._username_cache.pop(chat_id, None)
+        if username:
+            self._handle_cache.pop(normalize_username(username), None)
+        for key in [k for k, v in self._handle_cache.items() if v == chat_id]:
+            del self._handle_cache[key]
+
+    async def send_message(
         self,
         *,
-        chat_id: str,
+        chat_id: Union[int, str],
         text: str,
         parse_mode: Optional[str] = None,
         disable_web_page_preview: Optional[bool] = None,
-        reply_markup: Optional[Dict[str, Any]] = None,
+        reply_markup: Optional[Any] = None,
         protect_content: bool = True,
     ) -> Dict[str, Any]:
         """
-        Send a message via the Telegram Bot API using only the Python standard library.
+        Send a message via the Telegram Bot API.
 
         Args:
-            chat_id: Destination chat ID (user, group, or channel)
+            chat_id: Destination chat ID (user, group, or channel), or a public @channelusername
             text: The message text to send
             parse_mode: Optional parse mode (e.g. "MarkdownV2" or "HTML")
             disable_web_page_preview: Disable link previews if True
-            reply_markup: Optional reply markup dict (e.g. inline keyboard)
+            reply_markup: Optional reply markup dict (e.g. inline keyboard), or a pre-serialized orjson.Fragment
             protect_content: If True, prevent users from forwarding or saving the message
 
         Returns:
@@ -118,7 +468,7 @@ class TelegramClient:
         Raises:
             RuntimeError: If Telegram returns ok == False or an HTTP error occurs.
         """
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/sendMessage"
+        url = self._urls["sendMessage"]
 
         payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
         if parse_mode:
@@ -130,12 +480,70 @@ class TelegramClient:
         if reply_markup is not None:
             payload["reply_markup"] = reply_markup
 
-        return self._make_api_request(url, payload)
+        return await self._make_api_request(url, payload)
+
+    async def _send_plain_text(self, chat_id: Union[int, str], text: str, protect_content: bool = True) -> Dict[str, Any]:
+        """sendMessage for the common case of bare text, without send_message's optional-field checks."""
+        return await self._make_api_request(
+            self._urls["sendMessage"], {"chat_id": chat_id, "text": text, "protect_content": protect_content}
+        )
+
+    async def _send_with_markup(self, chat_id: Union[int, str], text: str, reply_markup: Any) -> Dict[str, Any]:
+        """sendMessage for the bot's protected button prompts."""
+        return await self._make_api_request(
+            self._urls["sendMessage"],
+            {"chat_id": chat_id, "text": text, "protect_content": True, "reply_markup": reply_markup},
+        )
+
+    def _queue_text(self, chat_id: int, text: str) -> None:
+        """Queue an unprotected reply; replies to one chat within COALESCE_DELAY_SECONDS go out as one message."""
+        buffer = self._out_buffers.get(chat_id)
+        if buffer and sum(map(len, buffer)) + len(buffer) + len(text) > MESSAGE_MAX_CHARS:
+            # Joining would overflow one message, so send what is queued first
+            self._flush_queued_text(chat_id)
+            buffer = None
+        if buffer is None:
+            buffer = self._out_buffers[chat_id] = []
+        buffer.append(text)
+        if chat_id not in self._out_flushes:
+            self._out_flushes[chat_id] = asyncio.get_running_loop().call_later(
+                COALESCE_DELAY_SECONDS, self._flush_queued_text, chat_id
+            )
+
+    def _flush_queued_text(self, chat_id: int) -> None:
+        """Send everything queued for chat_id now, as a single sendMessage."""
+        timer = self._out_flushes.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        buffer = self._out_buffers.pop(chat_id, None)
+        if not buffer:
+            return
+        # Only a single reply longer than one message can overflow; split it rather than cut it
+        task = asyncio.create_task(self._send_queued_text(chat_id, _split_message("\n".join(buffer))))
+        self._out_sends.add(task)
+        task.add_done_callback(self._out_sends.discard)
+
+    async def _send_queued_text(self, chat_id: int, chunks: List[str]) -> None:
+        for chunk in chunks:
+            for attempt in range(COALESCE_REQUEUE_LIMIT + 1):
+                try:
+                    await self._send_plain_text(chat_id, chunk, protect_content=False)
+                    break
+                except TelegramRetryAfter as exc:
+                    if attempt == COALESCE_REQUEUE_LIMIT:
+                        logger.error("Queued reply to chat %s still rate limited; dropping it", chat_id)
+                        return
+                    # Resend this text on its own; replies queued since go out in their own flush
+                    logger.warning("Queued reply to chat %s rate limited; retrying in %ss", chat_id, exc.retry_after)
+                    await asyncio.sleep(exc.retry_after)
+                except Exception:  # noqa: BLE001
+                    logger.exception("Failed to send queued reply to chat %s", chat_id)
+                    return
 
-    def send_photo(
+    async def send_photo(
         self,
         *,
-        chat_id: str,
+        chat_id: Union[int, str],
         photo: str,
         caption: Optional[str] = None,
         parse_mode: Optional[str] = None,
@@ -145,7 +553,7 @@ class TelegramClient:
         Send a photo via the Telegram Bot API.
 
         Args:
-            chat_id: Destination chat ID (user, group, or channel)
+            chat_id: Destination chat ID (user, group, or channel), or a public @channelusername
             photo: Photo to send (URL, file_id, or file path)
             caption: Optional photo caption
             parse_mode: Optional parse mode for caption
@@ -157,7 +565,7 @@ class TelegramClient:
         Raises:
             RuntimeError: If Telegram returns ok == False or an HTTP error occurs.
         """
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/sendPhoto"
+        url = self._urls["sendPhoto"]
 
         payload: Dict[str, Any] = {"chat_id": chat_id, "photo": photo}
         if caption:
@@ -167,9 +575,32 @@ class TelegramClient:
         if protect_content is not None:
             payload["protect_content"] = protect_content
 
-        return self._make_api_request(url, payload)
+        return await self._make_api_request(url, payload)
 
-    def get_chat(self, chat_identifier: str) -> Dict[str, Any]:
+    async def broadcast_message(self, text: str, *, protect_content: bool = True) -> int:
+        """
+        Send the same message to every registered chat.
+
+        Sends run concurrently but at most BROADCAST_CONCURRENCY are in flight at once,
+        which keeps the bot near Telegram's global limit of ~30 messages per second.
+
+        Returns:
+            Number of chats the message was delivered to.
+        """
+        chat_ids = await self._db_call("get_all_registered_ids")
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def send_one(chat_id: int) -> None:
+            async with semaphore:
+                await self._send_plain_text(chat_id, text, protect_content)
+
+        results = await asyncio.gather(*(send_one(chat_id) for chat_id in chat_ids), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            logger.error("Broadcast failed for %d of %d chats: %s", len(failures), len(results), failures[0])
+        return len(results) - len(failures)
+
+    async def get_chat(self, chat_identifier: str) -> Dict[str, Any]:
         """
         Fetch chat information using Bot API getChat.
 
@@ -177,17 +608,17 @@ class TelegramClient:
         supergroups/channels (e.g. "@mychannel"). For private users, username lookup
         is not supported by the Bot API.
         """
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/getChat"
+        url = self._urls["getChat"]
         payload = {"chat_id": chat_identifier}
         
-        result = self._make_api_request(url, payload)
+        result = await self._make_api_request(url, payload)
         
         chat = result.get("result")
         if not isinstance(chat, dict):
             raise RuntimeError("Unexpected response structure for getChat")
         return chat
 
-    def resolve_chat_id(self, username_or_id: str) -> int:
+    async def resolve_chat_id(self, username_or_id: str) -> int:
         """
         Resolve a chat id from a public @username (channels/supergroups) or pass-through a numeric id.
 
@@ -196,11 +627,13 @@ class TelegramClient:
         (e.g., Telethon/TDLib) with a user account.
         """
         # If numeric, return as int
-        if username_or_id.isdigit() or (username_or_id.startswith("-") and username_or_id[1:].isdigit()):
+        try:
             return int(username_or_id)
+        except ValueError:
+            pass
 
         if username_or_id.startswith("@"):  # public channel/supergroup username
-            chat = self.get_chat(chat_identifier=username_or_id)
+            chat = await self.get_chat(chat_identifier=username_or_id)
             chat_id = chat.get("id")
             if not isinstance(chat_id, int):
                 raise RuntimeError("getChat did not return a numeric chat id")
@@ -208,452 +641,551 @@ class TelegramClient:
 
         raise RuntimeError("Provide a numeric chat id or a public @username (channels/supergroups only)")
 
-    def send_decision_prompt(self, *, chat_id: int, prompt_text: str = "2B or not 2B?", initial_message_id: Optional[int] = None, pending_message: Optional[str] = None, image_message_id: Optional[int] = None, sender_handle: Optional[str] = None) -> Dict[str, Any]:
-        """Send a message with Yes/No inline keyboard buttons for the initial 'open' decision."""
-        approve_data = "open"
-        decline_data = "ignore"
-        
+    async def send_decision_prompt(self, *, chat_id: int, prompt_text: str = "2B or not 2B?", initial_message_id: Optional[int] = None, pending_message: Optional[str] = None, image_message_id: Optional[int] = None, sender_handle: Optional[str] = None, sender_chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """Send a message with Yes/No inline keyboard buttons for the initial 'open' decision.
+
+        sender_chat_id may be passed when the caller already resolved sender_handle, so the
+        later callbacks can notify the sender without another database lookup.
+        """
         # Include initial message ID in callback data if provided
-        if initial_message_id is not None:
-            approve_data = f"open:{initial_message_id}"
-            decline_data = f"ignore:{initial_message_id}"
+        approve_data = _callback_data("open", initial_message_id)
+        decline_data = _callback_data("ignore", initial_message_id)
         
         # Store all the data for the multi-stage flow
-        message_key = f"{chat_id}:{approve_data}"
         if pending_message is not None or image_message_id is not None or sender_handle is not None:
-            self._pending_messages[message_key] = {
-                "message": pending_message,
-                "image_message_id": image_message_id,
-                "sender_handle": sender_handle,
-                "stage": "open"  # Track which stage we're in
-            }
+            await self._pending_messages.set((int(chat_id), initial_message_id), Pending(
+                message=pending_message,
+                image_message_id=image_message_id,
+                sender_handle=sender_handle,
+                sender_chat_id=sender_chat_id,
+                stage="open",  # Track which stage we're in
+            ))
         
-        reply_markup = {
-            "inline_keyboard": [
-                [
-                    {"text": "Yes ✅", "callback_data": approve_data},
-                    {"text": "No ❌", "callback_data": decline_data},
-                ]
-            ]
-        }
-        return self.send_message(chat_id=str(chat_id), text=prompt_text, reply_markup=reply_markup, protect_content=True)
+        # Callback data is built by _callback_data, so it never needs JSON escaping
+        reply_markup = orjson.Fragment(_DECISION_MARKUP_TEMPLATE % (approve_data.encode(), decline_data.encode()))
+        return await self._send_with_markup(chat_id, prompt_text, reply_markup)
 
-    def send_accept_prompt(self, *, chat_id: int, message_content: str, approve_data: str, decline_data: str) -> Dict[str, Any]:
+    async def send_accept_prompt(self, *, chat_id: int, message_content: str, approve_data: str, decline_data: str) -> Dict[str, Any]:
         """Send the message content with accept/decline buttons for the second stage."""
-        reply_markup = {
-            "inline_keyboard": [
-                [
-                    {"text": "Accept ✅", "callback_data": approve_data},
-                    {"text": "Decline ❌", "callback_data": decline_data},
-                ]
-            ]
-        }
+        # Callback data is built by _callback_data, so it never needs JSON escaping
+        reply_markup = orjson.Fragment(_ACCEPT_MARKUP_TEMPLATE % (approve_data.encode(), decline_data.encode()))
         
         # Show the actual message content
         full_text = f"{message_content}\n\nDo you want to accept this message?"
-        return self.send_message(chat_id=str(chat_id), text=full_text, reply_markup=reply_markup, protect_content=True)
+        return await self._send_with_markup(chat_id, full_text, reply_markup)
 
-    def send_welcome_registration_prompt(self, *, chat_id: int) -> Dict[str, Any]:
+    async def send_welcome_registration_prompt(self, *, chat_id: int) -> Dict[str, Any]:
         """Send a welcome message with registration button."""
-        text = "Welcome to First Signal! Tap the button below to register and start receiving signals. ⏈"
-        reply_markup = {
-            "inline_keyboard": [
-                [
-                    {"text": "Register to check", "callback_data": "register"},
-                ]
-            ]
-        }
-        return self.send_message(chat_id=str(chat_id), text=text, reply_markup=reply_markup, protect_content=True)
+        return await self._send_with_markup(chat_id, _WELCOME_TEXT, _WELCOME_MARKUP)
 
-    def run_listener(self, *, allowed_chat_id: Optional[int] = None, prompt_text: str = "Approve this request?") -> None:
+    async def run_listener(self, *, allowed_chat_id: Optional[int] = None, prompt_text: str = "Approve this request?") -> None:
         """Run the main polling listener for handling incoming messages and callback queries."""
-        print("Starting Telegram long-polling listener...")
-        print(f"Allowed chat id: {allowed_chat_id if allowed_chat_id is not None else 'any'}")
+        logger.info("Starting Telegram long-polling listener...")
+        logger.info("Allowed chat id: %s", allowed_chat_id if allowed_chat_id is not None else "any")
         offset: Optional[int] = None
 
+        # getUpdates is refused while a webhook is registered
+        try:
+            await self.delete_webhook()
+        except Exception:  # noqa: BLE001
+            logger.exception("deleteWebhook error")
+
+        self.start_update_workers(allowed_chat_id=allowed_chat_id, prompt_text=prompt_text)
+        enqueue = self.enqueue_update
         try:
             while True:
                 try:
-                    updates = self._get_updates(offset=offset, timeout=50)
-                except Exception as exc:  # noqa: BLE001
-                    print(f"getUpdates error: {exc}", file=sys.stderr)
+                    updates = await self._get_updates(offset=offset, timeout=LONG_POLL_TIMEOUT_SECONDS)
+                except Exception:  # noqa: BLE001
+                    logger.exception("getUpdates error")
+                    await asyncio.sleep(1)
                     continue
 
-                results = updates.get("result", [])
-                for update in results:
+                for update in updates.get("result", []):
                     # Advance offset regardless of content
-                    if isinstance(update, dict) and "update_id" in update:
+                    try:
                         offset = update["update_id"] + 1
+                    except (TypeError, KeyError):
+                        logger.warning("Update without update_id: %r", update)
+                    await enqueue(update)
+        except asyncio.CancelledError:
+            logger.info("Listener stopped.")
+            raise
+        finally:
+            await self.stop_update_workers()
+
+    async def set_webhook(self, *, url: str, secret_token: Optional[str] = None) -> Dict[str, Any]:
+        """Ask Telegram to push updates to url instead of serving getUpdates."""
+        api_url = self._urls["setWebhook"]
+        payload: Dict[str, Any] = {"url": url, "allowed_updates": ALLOWED_UPDATES}
+        if secret_token:
+            payload["secret_token"] = secret_token
+
+        return await self._make_api_request(api_url, payload)
+
+    async def delete_webhook(self) -> Dict[str, Any]:
+        """Remove any registered webhook so getUpdates can be used."""
+        url = self._urls["deleteWebhook"]
+        return await self._make_api_request(url, {})
+
+    def start_update_workers(self, *, allowed_chat_id: Optional[int] = None, prompt_text: str = "Approve this request?") -> None:
+        """Start the tasks that handle queued updates, whether polled or pushed by a webhook."""
+        if self._update_workers:
+            return
+        # A bounded queue drained by a fixed set of workers, so slow handlers
+        # apply backpressure to update delivery instead of piling up
+        self._update_workers = [
+            asyncio.create_task(
+                self._update_worker(allowed_chat_id, prompt_text),
+                name=f"telegram-update-worker-{i}",
+            )
+            for i in range(UPDATE_WORKERS)
+        ]
+        self._agent_workers = [
+            asyncio.create_task(self._agent_worker(), name=f"telegram-agent-worker-{i}")
+            for i in range(AGENT_WORKERS)
+        ]
+
+    async def stop_update_workers(self) -> None:
+        """Cancel the update and agent workers started by start_update_workers."""
+        workers, self._update_workers = self._update_workers + self._agent_workers, []
+        self._agent_workers = []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def enqueue_update(self, update: Any) -> None:
+        """Queue an update for the workers, waiting while the queue is full."""
+        self._updates_since_sweep += 1
+        if self._updates_since_sweep >= PENDING_SWEEP_EVERY_UPDATES:
+            self._updates_since_sweep = 0
+            # Prompts nobody answered would otherwise sit in the store for days
+            await _log_failure("Pending sweep", self._pending_messages.sweep())
+        await self._updates_queue.put(update)
+
+    async def enqueue_webhook_update(self, update: Any) -> None:
+        """Queue an update pushed by the webhook, skipping ones Telegram has delivered before.
 
-                    # Handle callback queries (button presses)
-                    if isinstance(update, dict) and "callback_query" in update:
-                        self._handle_callback_query(update["callback_query"], allowed_chat_id)
-                        continue
+        Telegram redelivers an update whose webhook call failed or timed out; polling
+        never does, since the offset already acknowledges each batch.
+        """
+        try:
+            update_id = update["update_id"]
+        except (TypeError, KeyError):
+            update_id = None
+        if update_id is not None:
+            if update_id in self._seen_updates:
+                logger.info("Skipping redelivered update %s", update_id)
+                return
+            self._seen_updates[update_id] = True
+        await self.enqueue_update(update)
 
-                    # Handle normal messages
-                    if isinstance(update, dict) and "message" in update:
-                        self._handle_message(update["message"], allowed_chat_id, prompt_text)
-        except KeyboardInterrupt:
-            print("Listener stopped by user.")
+    async def _update_worker(self, allowed_chat_id: Optional[int], prompt_text: str) -> None:
+        """Handle queued updates until cancelled."""
+        while True:
+            update = await self._updates_queue.get()
+            try:
+                await self._dispatch_update(update, allowed_chat_id, prompt_text)
+            except Exception:  # noqa: BLE001
+                logger.exception("Update handling error")
+            finally:
+                self._updates_queue.task_done()
+
+    async def _agent_worker(self) -> None:
+        """Answer queued messages with the agent until cancelled."""
+        while True:
+            chat_id, text, prompt_text = await self._agent_queue.get()
+            try:
+                await self._answer_with_agent(chat_id, text, prompt_text)
+            except Exception:  # noqa: BLE001
+                logger.exception("Agent reply error")
+            finally:
+                self._agent_queue.task_done()
+
+    async def _dispatch_update(self, update: Any, allowed_chat_id: Optional[int], prompt_text: str) -> None:
+        """Route a single update to the matching handler."""
+        # Telegram always sends JSON objects; anything else is logged rather than type-checked up front
+        try:
+            if "callback_query" in update:
+                # Handle callback queries (button presses)
+                handled = self._handle_callback_query(update["callback_query"], allowed_chat_id)
+            elif "message" in update:
+                # Handle normal messages
+                handled = self._handle_message(update["message"], allowed_chat_id, prompt_text)
+            else:
+                return
+        except TypeError:
+            logger.warning("Ignoring malformed update: %r", update)
+            return
+        await handled
     
     # Private helper methods
     
-    def _make_api_request(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Make a POST request to the Telegram Bot API."""
-        data = json.dumps(payload).encode("utf-8")
-        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-
+    async def _post_json(self, url: str, payload: Dict[str, Any], timeout: float = 15) -> Any:
+        """POST a JSON payload to the Bot API and return the decoded response body."""
         try:
-            with urllib.request.urlopen(request, timeout=15) as response:
-                response_body = response.read().decode("utf-8")
-                result = json.loads(response_body)
-        except urllib.error.HTTPError as http_err:
-            error_text = http_err.read().decode("utf-8", errors="ignore") if hasattr(http_err, "read") else str(http_err)
-            raise RuntimeError(f"Telegram HTTP error: {http_err.code} {http_err.reason}: {error_text}") from http_err
-        except urllib.error.URLError as url_err:
-            raise RuntimeError(f"Network error calling Telegram Bot API: {url_err}") from url_err
+            response = await self._http.post(url, content=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=timeout)
+        except httpx.HTTPError as http_err:
+            raise RuntimeError(f"Network error calling Telegram Bot API: {http_err}") from http_err
 
+        if response.status_code == 429:
+            try:
+                retry_after = orjson.loads(response.content)["parameters"]["retry_after"]
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                retry_after = 1
+            raise TelegramRetryAfter(f"Telegram rate limit hit: retry after {retry_after}s", retry_after)
+        if response.is_error:
+            raise RuntimeError(f"Telegram HTTP error: {response.status_code} {response.reason_phrase}: {response.text}")
+        return orjson.loads(response.content)
+
+    @staticmethod
+    def _check_ok(result: Any, method: Optional[str] = None) -> Dict[str, Any]:
+        """Return result if Telegram reported ok, else raise with its description."""
         if not isinstance(result, dict) or not result.get("ok", False):
             description = result.get("description") if isinstance(result, dict) else "Unknown error"
-            raise RuntimeError(f"Telegram returned an error: {description}")
-
+            source = f" from {method}" if method else ""
+            raise RuntimeError(f"Telegram returned an error{source}: {description}")
         return result
 
-    def _get_updates(self, *, offset: Optional[int] = None, timeout: int = 50) -> Dict[str, Any]:
+    async def _make_api_request(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Make a POST request to the Telegram Bot API, throttled and retried on 429."""
+        chat_limiter = self._chat_limiter(payload["chat_id"]) if url in self._send_urls else None
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await self._global_limiter.acquire()
+            if chat_limiter is not None:
+                await chat_limiter.acquire()
+            try:
+                async with self._outbound:
+                    result = await self._post_json(url, payload)
+            except TelegramRetryAfter as exc:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                logger.warning("Telegram rate limit hit; retrying in %ss", exc.retry_after)
+                await asyncio.sleep(exc.retry_after)
+                continue
+            return self._check_ok(result)
+
+    def _chat_limiter(self, chat_id: Any) -> AsyncLimiter:
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = self._chat_limiters[chat_id] = AsyncLimiter(
+                CHAT_SEND_BURST, CHAT_SEND_BURST / CHAT_SENDS_PER_SECOND
+            )
+        return limiter
+
+    async def _get_updates(self, *, offset: Optional[int] = None, timeout: int = LONG_POLL_TIMEOUT_SECONDS) -> Dict[str, Any]:
         """Get updates from Telegram Bot API."""
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/getUpdates"
-        payload: Dict[str, Any] = {"timeout": timeout}
+        # Only the update types we handle, so Telegram doesn't send (and we don't parse) the rest
+        payload: Dict[str, Any] = {"timeout": timeout, "limit": UPDATES_BATCH_LIMIT, "allowed_updates": ALLOWED_UPDATES}
         if offset is not None:
             payload["offset"] = offset
 
-        data = json.dumps(payload).encode("utf-8")
-        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-
-        try:
-            with urllib.request.urlopen(request, timeout=timeout + 10) as response:
-                response_body = response.read().decode("utf-8")
-                result = json.loads(response_body)
-        except urllib.error.HTTPError as http_err:
-            error_text = http_err.read().decode("utf-8", errors="ignore") if hasattr(http_err, "read") else str(http_err)
-            raise RuntimeError(f"Telegram HTTP error: {http_err.code} {http_err.reason}: {error_text}") from http_err
-        except urllib.error.URLError as url_err:
-            raise RuntimeError(f"Network error calling Telegram Bot API: {url_err}") from url_err
-
-        if not isinstance(result, dict) or not result.get("ok", False):
-            description = result.get("description") if isinstance(result, dict) else "Unknown error"
-            raise RuntimeError(f"Telegram returned an error from getUpdates: {description}")
-
-        return result
+        # The HTTP timeout has to outlast the long poll itself
+        result = await self._post_json(self._urls["getUpdates"], payload, timeout=timeout + 10)
+        return self._check_ok(result, "getUpdates")
 
-    def _answer_callback_query(self, *, callback_query_id: str, text: Optional[str] = None, show_alert: bool = False) -> Dict[str, Any]:
+    async def _answer_callback_query(self, *, callback_query_id: str, text: Optional[str] = None, show_alert: bool = False) -> Dict[str, Any]:
         """Answer a callback query (button press)."""
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/answerCallbackQuery"
+        url = self._urls["answerCallbackQuery"]
         payload: Dict[str, Any] = {"callback_query_id": callback_query_id}
         if text is not None:
             payload["text"] = text
         if show_alert:
             payload["show_alert"] = True
 
-        return self._make_api_request(url, payload)
+        return await self._make_api_request(url, payload)
 
-    def _edit_message_text(self, *, chat_id: int, message_id: int, text: str) -> Dict[str, Any]:
+    async def _edit_message_text(self, *, chat_id: int, message_id: int, text: str) -> Dict[str, Any]:
         """Edit the text of an existing message."""
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/editMessageText"
+        url = self._urls["editMessageText"]
         payload: Dict[str, Any] = {
             "chat_id": chat_id,
             "message_id": message_id,
             "text": text,
         }
 
-        return self._make_api_request(url, payload)
+        return await self._make_api_request(url, payload)
 
-    def delete_message(self, *, chat_id: int, message_id: int) -> Dict[str, Any]:
+    async def delete_message(self, *, chat_id: int, message_id: int) -> Dict[str, Any]:
         """Delete a message."""
-        url = f"{TELEGRAM_API_BASE}/bot{self._token}/deleteMessage"
+        url = self._urls["deleteMessage"]
         payload: Dict[str, Any] = {
             "chat_id": chat_id,
             "message_id": message_id,
         }
 
-        return self._make_api_request(url, payload)
+        return await self._make_api_request(url, payload)
 
-    def _handle_callback_query(self, callback_query: Dict[str, Any], allowed_chat_id: Optional[int]) -> None:
+    async def _handle_callback_query(self, callback_query: Dict[str, Any], allowed_chat_id: Optional[int]) -> None:
         """Handle callback query (button press) events."""
+        message = callback_query.get("message") or {}
+        chat_id = (message.get("chat") or {}).get("id")
+        if allowed_chat_id is not None and chat_id != allowed_chat_id:
+            # Ignore callbacks from other chats before reading anything else
+            return
+
         data = callback_query.get("data")
         callback_query_id = callback_query.get("id")
-        message = callback_query.get("message", {}) or {}
-        chat = message.get("chat", {}) or {}
-        chat_id = chat.get("id")
         message_id = message.get("message_id")
-        from_user = callback_query.get("from", {}) or {}
-        username = from_user.get("username")
-
-        if allowed_chat_id is not None and chat_id != allowed_chat_id:
-            # Ignore callbacks from other chats
-            return
+        username = (callback_query.get("from") or {}).get("username")
 
         # Registration flow
         if data == "register" and callback_query_id and chat_id:
-            try:
-                self.register_chat(int(chat_id), username)
-                print(f"Registered chat_id={chat_id}, username={username}")
-            except Exception as exc:  # noqa: BLE001
-                print(f"Registration error: {exc}", file=sys.stderr)
-            try:
-                self._answer_callback_query(callback_query_id=callback_query_id, text="Registration complete ✅")
-            except Exception as exc:  # noqa: BLE001
-                print(f"answerCallbackQuery error: {exc}", file=sys.stderr)
+            async def register() -> None:
+                await self.register_chat(chat_id, username)
+                logger.info("Registered chat_id=%s, username=%s", chat_id, username)
+
+            # The acknowledgement doesn't wait on the database write
+            actions: List[Action] = [
+                ("Registration error", register()),
+                ("answerCallbackQuery error", self._answer_callback_query(callback_query_id=callback_query_id, text="Registration complete ✅")),
+            ]
             if message_id:
-                try:
-                    self._edit_message_text(chat_id=chat_id, message_id=message_id, text="Registration complete ✅")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"editMessageText error: {exc}", file=sys.stderr)
+                actions.append(("editMessageText error", self._edit_message_text(chat_id=chat_id, message_id=message_id, text="Registration complete ✅")))
+            await _flush_actions(actions)
             return
 
         # Multi-stage decision flow
         if data and callback_query_id and chat_id and message_id:
             # Parse callback data - it might include initial message ID
-            action = data
-            initial_message_id = None
-            if ":" in data:
-                action, initial_msg_id_str = data.split(":", 1)
-                try:
-                    initial_message_id = int(initial_msg_id_str)
-                except ValueError:
-                    pass  # Invalid format, ignore
-            
+            action, initial_message_id = _parse_cb(data)
+            pending_key = (chat_id, initial_message_id)
+
             # Stage 1: User clicked "Yes" to open the message
             if action == "open":
-                print(f"[STAGE 1 - OPEN] User {chat_id} opened a message")
-                message_key = f"{chat_id}:{data}"
-                pending_message_data = self._pending_messages.get(message_key)
+                logger.info("[STAGE 1 - OPEN] User %s opened a message", chat_id)
+                pending_message_data = await self._get_pending(chat_id, initial_message_id, "open")
                 
-                if pending_message_data and pending_message_data.get("message"):
+                actions: List[Action] = []
+                if pending_message_data and pending_message_data.message:
+                    # Update the stage and create new callback data for stage 2
+                    pending_message_data.stage = "accept"
+                    await self._pending_messages.set(pending_key, pending_message_data)
+                    accept_data = _callback_data("accept", initial_message_id)
+                    decline_data = _callback_data("decline_accept", initial_message_id)
+
                     # Delete the image message
-                    if pending_message_data.get("image_message_id"):
-                        try:
-                            self.delete_message(chat_id=chat_id, message_id=pending_message_data["image_message_id"])
-                        except Exception as exc:  # noqa: BLE001
-                            print(f"deleteMessage (image) error: {exc}", file=sys.stderr)
+                    if pending_message_data.image_message_id:
+                        actions.append(("deleteMessage (image) error", self.delete_message(chat_id=chat_id, message_id=pending_message_data.image_message_id)))
                     
                     # Delete the current prompt message
-                    try:
-                        self.delete_message(chat_id=chat_id, message_id=message_id)
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"deleteMessage (prompt) error: {exc}", file=sys.stderr)
-                    
-                    # Update the stage and create new callback data for stage 2
-                    pending_message_data["stage"] = "accept"
-                    accept_data = f"accept:{initial_message_id}" if initial_message_id else "accept"
-                    decline_data = f"decline_accept:{initial_message_id}" if initial_message_id else "decline_accept"
-                    
-                    # Store the data with new keys for stage 2
-                    accept_key = f"{chat_id}:{accept_data}"
-                    self._pending_messages[accept_key] = pending_message_data
+                    actions.append(("deleteMessage (prompt) error", self.delete_message(chat_id=chat_id, message_id=message_id)))
                     
                     # Send stage 2: show message content with accept/decline
-                    try:
-                        self.send_accept_prompt(
-                            chat_id=chat_id,
-                            message_content=pending_message_data["message"],
-                            approve_data=accept_data,
-                            decline_data=decline_data
-                        )
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"Failed to send accept prompt: {exc}", file=sys.stderr)
-                    
-                    # Clean up the old key
-                    if message_key in self._pending_messages:
-                        del self._pending_messages[message_key]
+                    actions.append(("Failed to send accept prompt", self.send_accept_prompt(
+                        chat_id=chat_id,
+                        message_content=pending_message_data.message,
+                        approve_data=accept_data,
+                        decline_data=decline_data
+                    )))
                 
-                try:
-                    self._answer_callback_query(callback_query_id=callback_query_id, text="Message opened")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"answerCallbackQuery error: {exc}", file=sys.stderr)
+                actions.append(("answerCallbackQuery error", self._answer_callback_query(callback_query_id=callback_query_id, text="Message opened")))
+
+                # None of these calls depend on each other
+                await _flush_actions(actions)
             
             # Stage 2: User clicked "Accept" after seeing the message content
             elif action == "accept":
-                print(f"[STAGE 2 - ACCEPT] User {chat_id} accepted a message from {pending_message_data.get('sender_handle', 'Unknown') if 'pending_message_data' in locals() else 'Unknown'}")
-                message_key = f"{chat_id}:{data}"
-                pending_message_data = self._pending_messages.get(message_key)
+                logger.info("[STAGE 2 - ACCEPT] User %s accepted a message", chat_id)
+                pending_message_data = await self._get_pending(chat_id, initial_message_id, "accept")
                 
                 if pending_message_data:
-                    print(f"[STAGE 2 - ACCEPT] Message from {pending_message_data.get('sender_handle', 'Unknown')} accepted by user {chat_id}")
+                    # Claim the record straight away so a double tap can't store it twice
+                    # (only race-free with the in-memory store)
+                    pending_message_data.stage = "accepted"
+                    await self._pending_messages.set(pending_key, pending_message_data)
+                    logger.info("[STAGE 2 - ACCEPT] Message from %s accepted by user %s", pending_message_data.sender_handle, chat_id)
                 
-                blockchain_result = None
+                # Acknowledge straight away rather than after the chain confirms
+                ack_task = asyncio.create_task(_log_failure("answerCallbackQuery error", self._answer_callback_query(callback_query_id=callback_query_id, text="Message accepted!")))
+
                 if pending_message_data:
-                    # Store message on blockchain if it exists
-                    if pending_message_data.get("message"):
-                        try:
-                            blockchain_client = get_blockchain_client()
-                            blockchain_result = blockchain_client.store_message(pending_message_data["message"])
-                            print(f"Blockchain transaction result: {blockchain_result}")
-                        except Exception as exc:  # noqa: BLE001
-                            print(f"Failed to store message on blockchain: {exc}", file=sys.stderr)
-                            blockchain_result = {"success": False, "error": str(exc)}
-                    
-                    # Edit the accept prompt message to remove buttons (keep the message content visible)
-                    try:
-                        message_text = pending_message_data["message"]
-                        self._edit_message_text(chat_id=chat_id, message_id=message_id, text=message_text)
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"editMessageText (remove buttons) error: {exc}", file=sys.stderr)
-                    
-                    # Stage 3: Reveal the sender's handle
-                    try:
-                        sender_text = f"🌹\n\nNot so secret admirer: {pending_message_data.get('sender_handle', 'Secret admirer')}"
-                        if blockchain_result and blockchain_result.get("success"):
-                            tx_hash = blockchain_result.get("transaction_hash", "")
-                            short_hash = tx_hash[:10] + "..." if len(tx_hash) > 10 else tx_hash
-                            sender_text += f"\n\n🔗 Stored on blockchain: {short_hash}"
-                        
-                        self.send_message(chat_id=str(chat_id), text=sender_text)
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"Failed to send sender reveal: {exc}", file=sys.stderr)
-                    
-                    # Stage 4: Send agent recommendation to the sender for next message
-                    if pending_message_data.get("sender_handle") and agent is not None:
-                        try:
-                            # Get recipient's username/handle
-                            db = get_database_client()
-                            recipient_username = db.get_username_by_chat_id(chat_id)
-                            recipient_name = recipient_username or f"User {chat_id}"
-                            
-                            # Prepare input for agent
-                            approved_message = pending_message_data.get("message", "")
-                            agent_input = f"My message '{approved_message}' was just approved by {recipient_name}. What should I send next to continue this connection? Give me advice for my next message to keep the conversation flowing naturally."
-                            
-                            print(f"Calling agent for next message recommendation: {agent_input}")
-                            agent_response = agent(user_input=agent_input)
-                            recommendation = agent_response.response if hasattr(agent_response, 'response') else str(agent_response)
-                            
-                            # Send recommendation to the original sender
-                            sender_chat_id = self._resolve_chat_id(pending_message_data.get("sender_handle"))
-                            recommendation_text = f"🎯 Great news! Your message was accepted! 🎉\n\n💡 Here's my recommendation for your next move:\n\n{recommendation}"
-                            
-                            self.send_message(chat_id=str(sender_chat_id), text=recommendation_text, protect_content=False)
-                            print(f"Sent agent recommendation to sender {pending_message_data.get('sender_handle')}")
-                            
-                        except Exception as exc:  # noqa: BLE001
-                            print(f"Failed to send agent recommendation to sender: {exc}", file=sys.stderr)
-                    
+                    # The reveal and the agent's advice to the sender don't depend on each other
+                    await asyncio.gather(
+                        self._reveal_sender(chat_id=chat_id, message_id=message_id, pending_message_data=pending_message_data),
+                        self._recommend_next_message(chat_id=chat_id, pending_message_data=pending_message_data),
+                    )
+
                     # Clean up the stored message
-                    del self._pending_messages[message_key]
-                
-                try:
-                    self._answer_callback_query(callback_query_id=callback_query_id, text="Message accepted!")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"answerCallbackQuery error: {exc}", file=sys.stderr)
+                    await self._pending_messages.delete(pending_key)
+
+                await ack_task
             
             # Handle declines at any stage
             elif action in ["ignore", "decline_accept"]:
-                # Find the message key - could be current or need to reconstruct
-                message_key = f"{chat_id}:{data}"
-                
-                # For ignore (stage 1), look for the open key
-                if action == "ignore":
-                    print(f"[STAGE 1 - DECLINE] User {chat_id} ignored/declined to open a message")
-                    
-                    # Get the pending message data first
-                    open_key = f"{chat_id}:{data.replace('ignore', 'open')}"
-                    pending_message_data = self._pending_messages.get(open_key)
-                    
-                    if pending_message_data and pending_message_data.get("sender_handle"):
-                        try:
-                            sender_id = self._resolve_chat_id(pending_message_data.get("sender_handle"))
-                            self.send_message(chat_id=str(sender_id), text='''Eh, looks like this arrow didn't land... 
+                # Both decline buttons resolve to the same record; the stage tells them apart
+                pending_message_data = await self._get_pending(chat_id, initial_message_id, "open" if action == "ignore" else "accept")
+                if pending_message_data:
+                    await self._pending_messages.delete(pending_key)
 
-I find a gadget from my pocket and ready to match you someone. Just let me know when you ready.''')
-                            print(f"[STAGE 1 - DECLINE] Notified sender {pending_message_data.get('sender_handle')} that user {chat_id} declined")
-                        except Exception as exc:  # noqa: BLE001
-                            print(f"Failed to notify sender of decline: {exc}", file=sys.stderr)
-                        
-                        print(f"[STAGE 1 - DECLINE] Message from {pending_message_data.get('sender_handle', 'Unknown')} ignored by user {chat_id}")
+                # Notify the sender, clean up this chat and answer; none of these calls depend on each other
+                actions: List[Action] = []
+
+                if action == "ignore":
+                    logger.info("[STAGE 1 - DECLINE] User %s ignored/declined to open a message", chat_id)
                     
-                    if open_key in self._pending_messages:
-                        del self._pending_messages[open_key]
+                    if pending_message_data and pending_message_data.sender_handle:
+                        actions.append(("Failed to notify sender of decline", self._notify_sender_declined(chat_id=chat_id, pending_message_data=pending_message_data)))
+                        logger.info("[STAGE 1 - DECLINE] Message from %s ignored by user %s", pending_message_data.sender_handle, chat_id)
                 else:
-                    # For decline_accept (stage 2), use current key
-                    pending_message_data = self._pending_messages.get(message_key)
                     if pending_message_data:
-                        print(f"[STAGE 2 - DECLINE] Message from {pending_message_data.get('sender_handle', 'Unknown')} declined by user {chat_id}")
+                        logger.info("[STAGE 2 - DECLINE] Message from %s declined by user %s", pending_message_data.sender_handle, chat_id)
                     else:
-                        print(f"[STAGE 2 - DECLINE] User {chat_id} declined to accept a message")
-                    if message_key in self._pending_messages:
-                        del self._pending_messages[message_key]
-                
+                        logger.info("[STAGE 2 - DECLINE] User %s declined to accept a message", chat_id)
+
                 # Delete the image message if we have its ID
-                if pending_message_data and pending_message_data.get("image_message_id"):
-                    try:
-                        self.delete_message(chat_id=chat_id, message_id=pending_message_data["image_message_id"])
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"deleteMessage (image) error: {exc}", file=sys.stderr)
+                image_message_id = pending_message_data.image_message_id if pending_message_data else None
+                if image_message_id:
+                    actions.append(("deleteMessage (image) error", self.delete_message(chat_id=chat_id, message_id=image_message_id)))
                 
-                # Delete the initial message if we have its ID
-                if initial_message_id is not None:
-                    try:
-                        self.delete_message(chat_id=chat_id, message_id=initial_message_id)
-                    except Exception as exc:  # noqa: BLE001
-                        print(f"deleteMessage (initial) error: {exc}", file=sys.stderr)
+                # Delete the initial message if we have its ID (usually the image itself)
+                if initial_message_id is not None and initial_message_id != image_message_id:
+                    actions.append(("deleteMessage (initial) error", self.delete_message(chat_id=chat_id, message_id=initial_message_id)))
                 
-                try:
-                    # Delete the current prompt message
-                    self.delete_message(chat_id=chat_id, message_id=message_id)
-                except Exception as exc:  # noqa: BLE001
-                    print(f"deleteMessage (prompt) error: {exc}", file=sys.stderr)
+                # Delete the current prompt message
+                actions.append(("deleteMessage (prompt) error", self.delete_message(chat_id=chat_id, message_id=message_id)))
                 
-                try:
-                    # Send the kills message
-                    self.send_message(chat_id=str(chat_id), text="Got it. Kills: +1")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"Failed to send kills message: {exc}", file=sys.stderr)
+                # Send the kills message
+                actions.append(("Failed to send kills message", self._send_plain_text(chat_id, "Got it. Kills: +1")))
                 
-                try:
-                    self._answer_callback_query(callback_query_id=callback_query_id, text="Declined")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"answerCallbackQuery error: {exc}", file=sys.stderr)
+                actions.append(("answerCallbackQuery error", self._answer_callback_query(callback_query_id=callback_query_id, text="Declined")))
 
-    def _handle_message(self, message: Dict[str, Any], allowed_chat_id: Optional[int], prompt_text: str) -> None:
-        """Handle incoming message events."""
-        chat = message.get("chat", {}) or {}
-        chat_id = chat.get("id")
-        from_user = message.get("from", {}) or {}
-        username = from_user.get("username")
-        text = message.get("text", "")
+                await _flush_actions(actions)
+
+    async def _notify_sender_declined(self, *, chat_id: int, pending_message_data: Pending) -> None:
+        """Tell the sender their signal was ignored."""
+        sender_id = await self._resolve_sender_chat_id(pending_message_data)
+        await self._send_plain_text(sender_id, '''Eh, looks like this arrow didn't land... 
+
+I find a gadget from my pocket and ready to match you someone. Just let me know when you ready.''')
+        logger.info("[STAGE 1 - DECLINE] Notified sender %s that user %s declined", pending_message_data.sender_handle, chat_id)
+
+    async def _reveal_sender(self, *, chat_id: int, message_id: int, pending_message_data: Pending) -> None:
+        """Remove the accept buttons and reveal who sent the message; its tx hash is edited in once stored."""
+        message = pending_message_data.message
+        sender_text = f"🌹\n\nNot so secret admirer: {pending_message_data.sender_handle}"
+        # The on-chain write can take seconds, so the reveal goes out first and is edited once it lands
+        chain_task = asyncio.create_task(_store_on_chain(message)) if message else None
+
+        # Stage 3: Reveal the sender's handle, while the accept prompt keeps its content but loses its buttons
+        _, reveal_response = await asyncio.gather(
+            _log_failure("editMessageText (remove buttons) error", self._edit_message_text(chat_id=chat_id, message_id=message_id, text=message)),
+            _log_failure("Failed to send sender reveal", self._send_plain_text(
+                chat_id, (sender_text + "\n\n🔗 Storing on blockchain...") if chain_task is not None else sender_text,
+            )),
+        )
+        if chain_task is None:
+            return
+
+        blockchain_result = await chain_task
+        reveal_message_id = (reveal_response or {}).get("result", {}).get("message_id")
+        if not reveal_message_id:
+            return
+        if blockchain_result.get("success"):
+            tx_hash = blockchain_result.get("transaction_hash", "")
+            short_hash = tx_hash[:10] + "..." if len(tx_hash) > 10 else tx_hash
+            sender_text += f"\n\n🔗 Stored on blockchain: {short_hash}"
+        await _log_failure("editMessageText (blockchain hash) error", self._edit_message_text(chat_id=chat_id, message_id=reveal_message_id, text=sender_text))
+
+    async def _agent_recommendation(self, async_agent: AsyncAgent, agent_input: str) -> str:
+        """Ask the agent for advice, reusing the answer for an identical prompt."""
+        key = hashlib.blake2b(agent_input.encode(), digest_size=16).digest()
+        try:
+            return self._recommendations[key]
+        except KeyError:
+            pass
+        agent_response = await async_agent(user_input=agent_input)
+        recommendation = agent_response.response
+        self._recommendations[key] = recommendation
+        return recommendation
+
+    async def _recommend_next_message(self, *, chat_id: int, pending_message_data: Pending) -> None:
+        """Stage 4: send the agent's suggestion for a follow-up to the sender of an accepted message."""
+        if not pending_message_data.sender_handle:
+            return
+        try:
+            # Loading the agent and looking up the recipient's username/handle are independent
+            async_agent, recipient_username = await asyncio.gather(
+                _load_async_agent(),
+                self.get_username(chat_id),
+            )
+            if async_agent is None:
+                return
+            recipient_name = recipient_username or f"User {chat_id}"
 
+            # Prepare input for agent
+            approved_message = pending_message_data.message
+            agent_input = f"My message '{approved_message}' was just approved by {recipient_name}. What should I send next to continue this connection? Give me advice for my next message to keep the conversation flowing naturally."
+
+            # Resolve the sender while the agent thinks
+            logger.info("Calling agent for next message recommendation: %s", agent_input)
+            recommendation, sender_chat_id = await asyncio.gather(
+                self._agent_recommendation(async_agent, agent_input),
+                self._resolve_sender_chat_id(pending_message_data),
+            )
+
+            # Send recommendation to the original sender
+            recommendation_text = f"🎯 Great news! Your message was accepted! 🎉\n\n💡 Here's my recommendation for your next move:\n\n{recommendation}"
+
+            self._queue_text(sender_chat_id, recommendation_text)
+            logger.info("Queued agent recommendation for sender %s", pending_message_data.sender_handle)
+
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to send agent recommendation to sender")
+
+    async def _handle_message(self, message: Dict[str, Any], allowed_chat_id: Optional[int], prompt_text: str) -> None:
+        """Handle incoming message events."""
+        # Telegram's chat.id is always an int, so it is used as-is below
+        chat_id = (message.get("chat") or {}).get("id")
         if allowed_chat_id is not None and chat_id != allowed_chat_id:
-            # Ignore messages from other chats
+            # Ignore messages from other chats before reading anything else
             return
 
+        from_user = message.get("from") or {}
+        username = from_user.get("username")
+        text = message.get("text", "")
+
         if chat_id is not None:
             # If not registered, send welcome and register button
-            if not self.is_chat_registered(int(chat_id)):
+            if not await self.is_chat_registered(chat_id):
                 try:
-                    self.send_welcome_registration_prompt(chat_id=int(chat_id))
-                except Exception as exc:  # noqa: BLE001
-                    print(f"Failed to send welcome prompt: {exc}", file=sys.stderr)
+                    await self.send_welcome_registration_prompt(chat_id=chat_id)
+                except Exception:  # noqa: BLE001
+                    logger.exception("Failed to send welcome prompt")
                 return
 
-            # Already registered: call agent with user message and send response
-            if text and agent is not None:
-                try:
-                    print(f"Calling agent with user input: {text}")
-                    agent_response = agent(user_input=text)
-                    response_text = agent_response.response if hasattr(agent_response, 'response') else str(agent_response)
-                    
-                    # Send the agent's response back to the user
-                    self.send_message(chat_id=str(chat_id), text=response_text, protect_content=False)
-                    print(f"Sent agent response to chat {chat_id}: {response_text}")
-                except Exception as exc:  # noqa: BLE001
-                    print(f"Failed to process message with agent: {exc}", file=sys.stderr)
-                    # Fallback to decision prompt if agent fails
-                    try:
-                        self.send_decision_prompt(chat_id=int(chat_id), prompt_text=prompt_text)
-                    except Exception as fallback_exc:  # noqa: BLE001
-                        print(f"Failed to send decision prompt: {fallback_exc}", file=sys.stderr)
-            else:
-                # No text message or agent not available: proceed with decision prompt
+            # Every message carries the sender's current username; in a private chat it maps to this chat
+            if from_user.get("id") == chat_id:
+                self._remember_handle(chat_id, username)
+
+            # Already registered: hand the message to the agent workers, or fall back to a decision prompt
+            if text and await _load_async_agent() is not None:
                 try:
-                    self.send_decision_prompt(chat_id=int(chat_id), prompt_text=prompt_text)
-                except Exception as exc:  # noqa: BLE001
-                    print(f"Failed to send decision prompt: {exc}", file=sys.stderr)
\ No newline at end of file
+                    self._agent_queue.put_nowait((chat_id, text, prompt_text))
+                    return
+                except asyncio.QueueFull:
+                    logger.warning("Agent queue full; sending chat %s a decision prompt instead", chat_id)
+            # No text message, agent not available or busy: proceed with decision prompt
+            try:
+                await self.send_decision_prompt(chat_id=chat_id, prompt_text=prompt_text)
+            except Exception:  # noqa: BLE001
+                logger.exception("Failed to send decision prompt")
+
+    async def _answer_with_agent(self, chat_id: int, text: str, prompt_text: str) -> None:
+        """Reply to a registered user's message with the agent's answer."""
+        try:
+            async_agent = await _load_async_agent()
+            logger.info("Calling agent with user input: %s", text)
+            agent_response = await async_agent(user_input=text)
+            response_text = agent_response.response
+
+            # Send the agent's response back to the user; quick successive replies are joined
+            self._queue_text(chat_id, response_text)
+            logger.info("Queued agent response to chat %s: %s", chat_id, response_text)
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to process message with agent")
+            # Fallback to decision prompt if agent fails
+            try:
+                await self.send_decision_prompt(chat_id=chat_id, prompt_text=prompt_text)
+            except Exception:  # noqa: BLE001
+                logger.exception("Failed to send decision prompt")
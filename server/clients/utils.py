@@ -1,5 +1,24 @@
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+# ASCII only: int() also takes "+5", "1_0" and non-Latin digits, none of which are chat ids
+_CHAT_ID_RE = re.compile(r"-?[0-9]+")
+
+
+# Configuration is read once per name; a missing variable raises again on every call
+@lru_cache(maxsize=None)
 def require_env(name: str) -> str:
     value = os.getenv(name)
     if not value:
         raise RuntimeError(f"Environment variable '{name}' is required but was not set.")
-    return value
\ No newline at end of file
+    return value
+
+
+def parse_chat_id(handle: str) -> Optional[int]:
+    """Return the handle as a numeric chat id, or None if it is a username."""
+    h = handle.strip()
+    if _CHAT_ID_RE.fullmatch(h) is None:
+        return None
+    return int(h)
@@ -1,11 +1,17 @@
-from typing import Optional
-from pydantic import BaseModel, Field
-
-class SendRequest(BaseModel):
-    handle: Optional[str] = Field(
-        default=None,
-        description="Telegram @username/handle (public channels/supergroups), or a previously-registered user",
-    )
-    chat_id: Optional[int] = Field(default=None, description="Numeric chat id")
-    message: str = Field(..., description="Message text to send with Yes/No buttons")
-    sender_handle: Optional[str] = Field(default=None, description="Handle of the message sender to reveal in stage 3")
+from typing import Annotated, Optional
+
+import msgspec
+
+
+class SendRequest(msgspec.Struct, kw_only=True):
+    """Body of POST /send, decoded and validated straight from the request bytes."""
+
+    handle: Annotated[
+        Optional[str],
+        msgspec.Meta(description="Telegram @username/handle (public channels/supergroups), or a previously-registered user"),
+    ] = None
+    chat_id: Annotated[Optional[int], msgspec.Meta(description="Numeric chat id")] = None
+    message: Annotated[str, msgspec.Meta(description="Message text to send with Yes/No buttons")]
+    sender_handle: Annotated[
+        Optional[str], msgspec.Meta(description="Handle of the message sender to reveal in stage 3")
+    ] = None
@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(slots=True)
+class Pending:
+    """A decision prompt waiting on the recipient's buttons."""
+    message: Optional[str] = None
+    image_message_id: Optional[int] = None
+    sender_handle: Optional[str] = None
+    sender_chat_id: Optional[int] = None
+    stage: str = "open"
@@ -3,6 +3,8 @@ CREATE TABLE IF NOT EXISTS registered_users (
     id BIGSERIAL PRIMARY KEY,
     chat_id BIGINT UNIQUE NOT NULL,
     username TEXT,
+    -- Lookup key for usernames: lowercased, without the leading @
+    username_norm TEXT GENERATED ALWAYS AS (lower(ltrim(username, '@'))) STORED,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -10,9 +12,16 @@ CREATE TABLE IF NOT EXISTS registered_users (
 -- Create index on chat_id for faster lookups
 CREATE INDEX IF NOT EXISTS idx_registered_users_chat_id ON registered_users(chat_id);
 
+-- Add the normalized username column to tables created before it existed
+ALTER TABLE registered_users
+    ADD COLUMN IF NOT EXISTS username_norm TEXT GENERATED ALWAYS AS (lower(ltrim(username, '@'))) STORED;
+
 -- Create index on username for faster username lookups
 CREATE INDEX IF NOT EXISTS idx_registered_users_username ON registered_users(username);
 
+-- Create index on the normalized username used by handle lookups
+CREATE INDEX IF NOT EXISTS idx_registered_users_username_norm ON registered_users(username_norm);
+
 -- Create a function to automatically update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
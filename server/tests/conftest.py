@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import orjson
+import pytest
+
+from clients.pending import MemoryPendingStore
+from clients.telegram import TelegramClient
+
+
+class FakeBotApi:
+    """Stands in for api.telegram.org; queued responses are returned first, then ok."""
+
+    def __init__(self):
+        self.responses = []
+        self.calls = []
+
+    def rate_limit(self, times: int, retry_after: float = 0) -> None:
+        """Answer the next `times` calls with a 429."""
+        body = {"ok": False, "parameters": {"retry_after": retry_after}}
+        self.responses.extend(httpx.Response(429, json=body) for _ in range(times))
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append((request.url.path.rsplit("/", 1)[-1], orjson.loads(request.content)))
+        if self.responses:
+            return self.responses.pop(0)
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": len(self.calls)}})
+
+
+@pytest.fixture
+def bot_api():
+    return FakeBotApi()
+
+
+@pytest.fixture
+async def telegram_client(bot_api):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(bot_api))
+    client = TelegramClient("token", http=http, pending_store=MemoryPendingStore())
+    yield client
+    await client.aclose()
+    await http.aclose()
+
+
+class FakeEmbedder:
+    """Deterministic pseudo-random vectors, one per distinct text; counts calls by action."""
+
+    def __init__(self, ndim: int):
+        self.ndim = ndim
+        self.calls = {"add": 0, "search": 0}
+
+    def embed(self, text, action):
+        self.calls[action] += 1
+        rng = np.random.default_rng(abs(hash(text)) % 2**32)
+        return rng.standard_normal(self.ndim).tolist()
+
+
+class FakePineconeIndex:
+    """The slice of pinecone.Index that MemoryTools reads Mem0's vectors through."""
+
+    def __init__(self, query_seconds: float = 0.0):
+        self.query_seconds = query_seconds
+        self.vectors = {}
+        self.queries = 0
+        self.fetches = 0
+
+    def query(self, vector, top_k, filter, include_metadata, include_values):
+        self.queries += 1
+        time.sleep(self.query_seconds)
+        user_id = filter["user_id"]["$eq"]
+        matches = [
+            SimpleNamespace(id=id_, values=values, metadata=metadata)
+            for id_, (values, metadata) in list(self.vectors.items())
+            if metadata["user_id"] == user_id
+        ]
+        return SimpleNamespace(matches=matches[:top_k])
+
+    def fetch(self, ids):
+        self.fetches += 1
+        return SimpleNamespace(
+            vectors={id_: SimpleNamespace(values=self.vectors[id_][0]) for id_ in ids if id_ in self.vectors}
+        )
+
+
+class FakeMemory:
+    """Records Mem0 calls; add() can be slowed down like the real LLM extraction."""
+
+    def __init__(self, ndim: int, add_seconds: float = 0.0, query_seconds: float = 0.0, stored=()):
+        self.embedding_model = FakeEmbedder(ndim)
+        self.vector_store = SimpleNamespace(index=FakePineconeIndex(query_seconds))
+        self.add_seconds = add_seconds
+        self.added = []
+        self.searches = 0
+        self._lock = threading.Lock()
+        # What Mem0 already held before this process started
+        for text in stored:
+            self._upsert(text, "u1")
+
+    @property
+    def stored(self):
+        return [metadata["data"] for _, metadata in self.vector_store.index.vectors.values()]
+
+    def _upsert(self, text, user_id):
+        id_ = str(uuid.uuid4())
+        vector = self.embedding_model.embed(text, "add")
+        self.vector_store.index.vectors[id_] = (vector, {"data": text, "user_id": user_id})
+        return id_
+
+    def add(self, messages, user_id):
+        time.sleep(self.add_seconds)
+        with self._lock:
+            self.added.append((messages, user_id))
+            id_ = self._upsert(messages, user_id)
+        return {"results": [{"id": id_, "memory": messages, "event": "ADD"}]}
+
+    def get_all(self, user_id, limit=100):
+        return {"results": [{"memory": text} for text in self.stored[:limit]]}
+
+    def search(self, query, user_id, limit=100):
+        self.searches += 1
+        return {"results": [{"memory": text} for text in self.stored[:limit]]}
+
+
+@pytest.fixture
+def make_memory():
+    from agent import EMBEDDING_DIMS
+
+    return lambda **kwargs: FakeMemory(EMBEDDING_DIMS, **kwargs)
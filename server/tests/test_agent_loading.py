@@ -0,0 +1,41 @@
+import pytest
+
+from clients import telegram
+from clients.constants import AGENT_QUEUE_SIZE
+
+
+@pytest.fixture(autouse=True)
+def fresh_agent(monkeypatch):
+    monkeypatch.setattr(telegram, "_async_agent", None)
+    monkeypatch.setattr(telegram, "_agent_unavailable", False)
+    monkeypatch.setattr(telegram, "_agent_retry_at", 0.0)
+
+
+async def test_failed_agent_build_is_not_retried_per_message(monkeypatch):
+    builds = []
+
+    def failing_build():
+        builds.append(1)
+        raise RuntimeError("no OPENAI_API_KEY")
+
+    monkeypatch.setattr(telegram, "_import_async_agent", failing_build)
+
+    assert await telegram._load_async_agent() is None
+    assert await telegram._load_async_agent() is None
+    assert len(builds) == 1
+
+
+async def test_full_agent_queue_falls_back_to_a_decision_prompt(telegram_client, bot_api, monkeypatch):
+    async def registered(chat_id):
+        return True
+
+    monkeypatch.setattr(telegram, "_async_agent", object())
+    monkeypatch.setattr(telegram_client, "is_chat_registered", registered)
+    for _ in range(AGENT_QUEUE_SIZE):
+        telegram_client._agent_queue.put_nowait((1, "queued", "prompt"))
+
+    message = {"chat": {"id": 42}, "from": {"id": 42, "username": "alice"}, "text": "hello"}
+    await telegram_client._handle_message(message, None, "2B or not 2B?")
+
+    assert [(method, payload["chat_id"]) for method, payload in bot_api.calls] == [("sendMessage", 42)]
+    assert "reply_markup" in bot_api.calls[0][1]
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+# app reads these at import time
+for _name in ("TELEGRAM_BOT_TOKEN", "CDP_API_KEY_ID", "CDP_API_KEY_SECRET", "CDP_WALLET_SECRET"):
+    os.environ.setdefault(_name, "test")
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    sent = []
+
+    async def send_photo(*, chat_id, photo):
+        sent.append(("photo", chat_id))
+        return {"ok": True, "result": {"message_id": 10}}
+
+    async def send_decision_prompt(*, chat_id, initial_message_id, pending_message, **kwargs):
+        sent.append(("prompt", chat_id, initial_message_id, pending_message))
+        return {"ok": True, "result": {"message_id": 11}}
+
+    async def no_payment(request, call_next):
+        return await call_next(request)
+
+    monkeypatch.setattr(app_module.telegram_client, "send_photo", send_photo)
+    monkeypatch.setattr(app_module.telegram_client, "send_decision_prompt", send_decision_prompt)
+    # Set by the lifespan, which TestClient only runs when used as a context manager
+    monkeypatch.setattr(app_module.app.state, "payment_middleware", no_payment, raising=False)
+    client = TestClient(app_module.app)
+    client.sent = sent
+    return client
+
+
+def test_send_routes_a_valid_body(client):
+    response = client.post("/send", json={"handle": "12345", "message": "hello"})
+
+    assert response.status_code == 200
+    assert response.json() == {"ok": True, "chat_id": 12345, "message_id": 11, "image_message_id": 10}
+    assert client.sent == [("photo", 12345), ("prompt", 12345, 10, "hello")]
+
+
+@pytest.mark.parametrize("body", [b"{not json", b'{"handle": "12345"}', b'{"handle": 5, "message": "hi"}'])
+def test_send_rejects_a_malformed_body(client, body):
+    response = client.post("/send", content=body, headers={"Content-Type": "application/json"})
+
+    assert response.status_code == 422
+    assert client.sent == []
+
+
+def test_send_request_schema_is_published(client):
+    operation = client.get("/openapi.json").json()["paths"]["/send"]["post"]
+    schema = operation["requestBody"]["content"]["application/json"]["schema"]
+
+    assert schema["required"] == ["message"]
+    assert set(schema["properties"]) == {"handle", "chat_id", "message", "sender_handle"}
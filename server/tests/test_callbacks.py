@@ -0,0 +1,22 @@
+import pytest
+
+from clients.telegram import _callback_data, _parse_cb
+
+
+@pytest.mark.parametrize("action", ["open", "ignore", "accept", "decline_accept"])
+@pytest.mark.parametrize("initial_message_id", [None, 0, 12345, -7])
+def test_callback_data_round_trip(action, initial_message_id):
+    data = _callback_data(action, initial_message_id)
+
+    assert len(data.encode()) <= 64
+    assert _parse_cb(data) == (action, initial_message_id)
+
+
+def test_parse_cb_accepts_long_action_names():
+    assert _parse_cb("decline_accept:42") == ("decline_accept", 42)
+    assert _parse_cb("open") == ("open", None)
+
+
+@pytest.mark.parametrize("data", ["", "x", "o:", "o:abc", "o:1:2", "open:", "opened", " o:1"])
+def test_parse_cb_rejects_foreign_data(data):
+    assert _parse_cb(data) == (None, None)
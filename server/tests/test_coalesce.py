@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from clients import telegram
+from clients.constants import COALESCE_REQUEUE_LIMIT, MESSAGE_MAX_CHARS, RATE_LIMIT_RETRIES
+
+
+@pytest.fixture(autouse=True)
+def short_coalesce_delay(monkeypatch):
+    monkeypatch.setattr(telegram, "COALESCE_DELAY_SECONDS", 0.01)
+
+
+async def _drain(client):
+    await asyncio.sleep(0.05)
+    while client._out_sends:
+        await asyncio.gather(*client._out_sends)
+
+
+async def test_queued_replies_are_coalesced_per_chat(telegram_client, bot_api):
+    telegram_client._queue_text(1, "one")
+    telegram_client._queue_text(2, "other chat")
+    telegram_client._queue_text(1, "two")
+    await _drain(telegram_client)
+
+    sent = sorted((payload["chat_id"], payload["text"]) for _, payload in bot_api.calls)
+    assert sent == [(1, "one\ntwo"), (2, "other chat")]
+    assert all(payload["protect_content"] is False for _, payload in bot_api.calls)
+
+
+async def test_queued_replies_flush_early_instead_of_overflowing(telegram_client, bot_api):
+    long_text = "a" * (MESSAGE_MAX_CHARS - 10)
+
+    telegram_client._queue_text(1, long_text)
+    telegram_client._queue_text(1, "tail that does not fit")
+    await _drain(telegram_client)
+
+    assert [payload["text"] for _, payload in bot_api.calls] == [long_text, "tail that does not fit"]
+
+
+async def test_rate_limited_queued_reply_is_requeued(telegram_client, bot_api):
+    bot_api.rate_limit(RATE_LIMIT_RETRIES + 1)
+
+    telegram_client._queue_text(1, "first")
+    await _drain(telegram_client)
+
+    texts = [payload["text"] for _, payload in bot_api.calls]
+    assert texts == ["first"] * (RATE_LIMIT_RETRIES + 2)
+
+
+async def test_rate_limited_queued_reply_is_dropped_after_the_requeue_limit(telegram_client, bot_api):
+    attempts = (RATE_LIMIT_RETRIES + 1) * (COALESCE_REQUEUE_LIMIT + 1)
+    bot_api.rate_limit(attempts + 1)
+
+    telegram_client._queue_text(1, "first")
+    await _drain(telegram_client)
+
+    assert len(bot_api.calls) == attempts
+
+
+async def test_overlong_queued_reply_is_split_not_truncated(telegram_client, bot_api):
+    long_text = "a" * (MESSAGE_MAX_CHARS - 10) + "\n" + "b" * 20
+
+    telegram_client._queue_text(1, long_text)
+    await _drain(telegram_client)
+
+    texts = [payload["text"] for _, payload in bot_api.calls]
+    assert texts == ["a" * (MESSAGE_MAX_CHARS - 10), "b" * 20]
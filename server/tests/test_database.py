@@ -0,0 +1,97 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+
+from clients import database
+from clients.pending import MemoryPendingStore
+from clients.telegram import TelegramClient
+
+
+class _PostgrestHandler(BaseHTTPRequestHandler):
+    """Answers registered_users lookups; hangs up on the request after drop_next is set."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        if self.server.drop_next:
+            self.server.drop_next = False
+            # Read the request, then close the socket without a response
+            self.close_connection = True
+            return
+        rows = [{"chat_id": 42}] if "username_norm" in self.path else []
+        body = orjson.dumps(rows)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PostgrestHandler)
+    server.drop_next = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("SUPABASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "header.payload.signature")
+    yield server
+    database.close_database_client()
+    server.shutdown()
+    server.server_close()
+
+
+async def test_db_call_reconnects_after_broken_connection(postgrest):
+    client = TelegramClient("token", pending_store=MemoryPendingStore())
+    try:
+        assert await client._db_call("find_chat_id_by_username", "alice") == 42
+        first = database.get_database_client()
+
+        postgrest.drop_next = True
+        assert await client._db_call("find_chat_id_by_username", "alice") == 42
+
+        second = database.get_database_client()
+        assert second is not first
+        # Nothing else was running on the broken client, so its pool is closed
+        assert first._http.is_closed
+    finally:
+        await client.aclose()
+
+
+def test_retired_client_closes_after_calls_in_flight(postgrest):
+    db = database.get_database_client()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_lookup():
+        started.set()
+        release.wait()
+
+    db.slow_lookup = slow_lookup
+    caller = threading.Thread(target=db.call, args=("slow_lookup",))
+    caller.start()
+    started.wait()
+
+    database.reset_database_client(db)
+    assert not db._http.is_closed
+    with pytest.raises(database.RetiredClientError):
+        db.call("find_chat_id_by_username", "alice")
+
+    release.set()
+    caller.join()
+    assert db._http.is_closed
+
+
+def test_reset_only_discards_the_failed_client(postgrest):
+    current = database.get_database_client()
+    stale = object()
+
+    database.reset_database_client(stale)
+    assert database.get_database_client() is current
+
+    database.reset_database_client(current)
+    assert database.get_database_client() is not current
@@ -0,0 +1,86 @@
+import threading
+
+import agent
+from agent import MemoryTools
+
+
+def test_local_search_includes_memories_stored_before_restart(make_memory):
+    memory = make_memory(stored=["likes tea", "allergic to cats"])
+    tools = MemoryTools(memory)
+
+    tools.store_memory("has a dog", user_id="u1")
+    found = tools.search_memories("pets", user_id="u1", limit=2)
+    found_all = tools.search_memories("pets", user_id="u1", limit=5)
+
+    assert memory.searches == 0
+    assert found.count("\n") == 3
+    for text in ("likes tea", "allergic to cats", "has a dog"):
+        assert text in found_all
+
+
+def test_mirror_is_filled_from_stored_vectors(make_memory):
+    memory = make_memory(stored=["likes tea", "allergic to cats"])
+    tools = MemoryTools(memory)
+
+    tools.store_memory("has a dog", user_id="u1")
+    tools.search_memories("pets", user_id="u1")
+    tools.search_memories("drinks", user_id="u1")
+
+    # Only Mem0's own write embeds and the two query embeds
+    assert memory.embedding_model.calls == {"add": 3, "search": 2}
+    assert memory.vector_store.index.queries == 1
+
+
+def test_writes_reload_the_mirror_on_the_next_search(make_memory):
+    memory = make_memory(stored=["likes tea"])
+    tools = MemoryTools(memory)
+
+    tools.search_memories("drinks", user_id="u1")
+    tools.store_memory("likes coffee", user_id="u1")
+    found = tools.search_memories("drinks", user_id="u1")
+
+    assert "likes coffee" in found
+    assert memory.vector_store.index.queries == 2
+
+
+def test_concurrent_searches_reload_the_mirror_once(make_memory):
+    memory = make_memory(query_seconds=0.1, stored=["likes tea"])
+    tools = MemoryTools(memory)
+
+    threads = [
+        threading.Thread(target=tools.search_memories, args=("drinks",), kwargs={"user_id": "u1"})
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert memory.vector_store.index.queries == 1
+
+
+def test_users_over_the_mirror_cap_are_searched_in_mem0(make_memory, monkeypatch):
+    monkeypatch.setattr(agent, "LOCAL_INDEX_MAX_MEMORIES", 2)
+    memory = make_memory(stored=["likes tea", "allergic to cats", "has a dog"])
+    tools = MemoryTools(memory)
+
+    tools.store_memory("plays chess", user_id="u1")
+    found = tools.search_memories("hobbies", user_id="u1", limit=1)
+    tools.search_memories("hobbies", user_id="u1", limit=1)
+
+    assert memory.searches == 2
+    assert memory.vector_store.index.queries == 1
+    assert "likes tea" in found
+
+
+def test_preferences_reuse_the_stored_vector(make_memory):
+    memory = make_memory()
+    tools = MemoryTools(memory)
+
+    tools.store_preference("drink", "prefers tea", user_id="u1")
+    tools.store_preference("drink", "prefers coffee", user_id="u1")
+    found = tools.search_preferences("drinks", user_id="u1")
+
+    assert "prefers coffee" in found
+    assert "prefers tea" not in found
+    assert memory.embedding_model.calls["add"] == 2
@@ -0,0 +1,20 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import MemoryTools
+
+
+def test_concurrent_writes_are_separate_adds(make_memory):
+    memory = make_memory(add_seconds=0.2)
+    tools = MemoryTools(memory)
+    contents = ["likes tea", "moved to Lisbon", "has a dog"]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(len(contents)) as pool:
+        results = list(pool.map(lambda content: tools.store_memory(content, user_id="u1"), contents))
+    elapsed = time.monotonic() - started
+
+    assert results == [f"Stored memory: {content}" for content in contents]
+    # One add per message, never a joined list of unrelated messages
+    assert sorted(memory.added) == sorted((content, "u1") for content in contents)
+    assert elapsed < 0.2 * len(contents)
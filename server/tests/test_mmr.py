@@ -0,0 +1,30 @@
+import numpy as np
+
+from agent import _mmr_select
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([
+        [1.0, 0.3, 0.0],    # most relevant
+        [1.0, 0.31, 0.0],   # near-duplicate of the first
+        [0.9, -0.44, 0.0],  # less relevant but different
+    ])
+
+    assert _mmr_select(query, candidates, 2) == [0, 2]
+    # With all weight on relevance it is a plain top-k
+    assert _mmr_select(query, candidates, 2, weight=1.0) == [0, 1]
+
+
+def test_mmr_returns_every_candidate_in_relevance_order_when_k_is_large():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.0, 1.0], [1.0, 0.0], [1.0, 1.0]])
+
+    assert _mmr_select(query, candidates, 10) == [1, 2, 0]
+
+
+def test_mmr_ignores_vector_scale():
+    query = np.array([2.0, 0.0])
+    candidates = np.array([[10.0, 10.0], [0.5, 0.0]])
+
+    assert _mmr_select(query, candidates, 1) == [1]
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from clients.pending import MemoryPendingStore, SQLitePendingStore
+from schemas.telegram import Pending
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryPendingStore()
+    else:
+        store = SQLitePendingStore(str(tmp_path / "pending.db"))
+    yield store
+    await store.aclose()
+
+
+async def test_round_trip(store):
+    key = (42, 7)
+    pending = Pending(message="hi", image_message_id=6, sender_handle="@alice", sender_chat_id=1)
+
+    assert await store.get(key) is None
+    await store.set(key, pending)
+    assert await store.get(key) == pending
+
+    pending.stage = "accepted"
+    await store.set(key, pending)
+    assert (await store.get(key)).stage == "accepted"
+
+    await store.delete(key)
+    assert await store.get(key) is None
+
+
+async def test_keys_without_message_id_are_distinct(store):
+    await store.set((42, None), Pending(message="first"))
+    await store.set((42, 1), Pending(message="second"))
+
+    assert (await store.get((42, None))).message == "first"
+    assert (await store.get((42, 1))).message == "second"
+
+
+async def test_delete_missing_key_is_a_no_op(store):
+    await store.delete((42, 7))
+    assert await store.get((42, 7)) is None
+
+
+async def test_per_record_ttl(store):
+    await store.set((42, 1), Pending(message="expired"), ttl=0)
+    await store.set((42, 2), Pending(message="live"), ttl=60)
+    await store.sweep()
+
+    assert await store.get((42, 1)) is None
+    assert (await store.get((42, 2))).message == "live"
+
+
+async def test_sqlite_close_waits_for_calls_in_flight(tmp_path):
+    store = SQLitePendingStore(str(tmp_path / "pending.db"))
+    writes = [store.set((42, i), Pending(message=str(i))) for i in range(20)]
+
+    # Queued before aclose(), so every write lands before the connection closes
+    await asyncio.gather(*writes, store.aclose())
+
+    with pytest.raises(RuntimeError):
+        await store.get((42, 0))
+    reopened = SQLitePendingStore(str(tmp_path / "pending.db"))
+    assert (await reopened.get((42, 19))).message == "19"
+    await reopened.aclose()
@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from clients.constants import RATE_LIMIT_RETRIES
+from clients.telegram import TelegramRetryAfter
+
+
+async def test_retry_after_is_honoured(telegram_client, bot_api):
+    bot_api.rate_limit(RATE_LIMIT_RETRIES)
+
+    result = await telegram_client._send_plain_text(42, "hi")
+
+    assert result["ok"] is True
+    assert len(bot_api.calls) == RATE_LIMIT_RETRIES + 1
+
+
+async def test_retry_after_gives_up_after_the_retry_budget(telegram_client, bot_api):
+    bot_api.rate_limit(RATE_LIMIT_RETRIES + 1)
+
+    with pytest.raises(TelegramRetryAfter) as excinfo:
+        await telegram_client._send_plain_text(42, "hi")
+
+    assert excinfo.value.retry_after == 0
+    assert len(bot_api.calls) == RATE_LIMIT_RETRIES + 1
+
+
+async def test_back_to_back_sends_to_one_chat_are_not_throttled(telegram_client, bot_api):
+    started = time.monotonic()
+    await telegram_client.send_photo(chat_id=42, photo="https://example.com/a.jpg")
+    await telegram_client._send_plain_text(42, "Open it?")
+
+    assert time.monotonic() - started < 0.5
+    assert [method for method, _ in bot_api.calls] == ["sendPhoto", "sendMessage"]